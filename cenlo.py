@@ -4,14 +4,16 @@ import sys
 import os
 import time
 import math
+import random
 import re
 import threading
 import platform
-import urllib.request
-import ssl
 import warnings
 import base64
 import hashlib
+import json
+import glob
+import struct
 from datetime import datetime, timedelta
 
 # =============================================
@@ -111,6 +113,107 @@ GPU_LOG_FILES = {}
 
 MAX_BATCHES_PER_RUN = 4398046511104  
 
+# SQLite stand-in for the SQL Server batch table (tests, air-gapped boxes)
+SQLITE_DB = os.environ.get('XIEBO_SQLITE_DB', '')
+
+# Database resilience
+DB_RETRY_ATTEMPTS = 5
+DB_RETRY_BASE_DELAY = 0.5
+DB_RETRY_MAX_DELAY = 30
+DB_CIRCUIT_FAILURE_THRESHOLD = 5
+DB_CIRCUIT_RESET_TIMEOUT = 30
+
+# Exported counters (Prometheus text format)
+METRICS = {}
+METRICS_LOCK = threading.Lock()
+METRICS_FILE = os.path.join(LOG_DIR, "metrics.prom")
+
+# Host resource governor
+# XIEBO_CPU_AFFINITY: "" (off), "auto" (NUMA-local cores from /sys) or "0=0-7;1=8-15"
+CPU_AFFINITY_SPEC = os.environ.get('XIEBO_CPU_AFFINITY', '').strip()
+HOUSEKEEPING_NICE = int(os.environ.get('XIEBO_HOUSEKEEPING_NICE', '0'))   # opt-in, e.g. 10
+CHILD_NICE = int(os.environ.get('XIEBO_CHILD_NICE', '0'))
+GPU_CPU_SETS = {}
+
+# Structured JSON-lines logs with a per-batch offset index
+STRUCTURED_LOGS = os.environ.get('XIEBO_STRUCTURED_LOGS', '1') != '0'
+STRUCTURED_LOG_ROTATE_BYTES = int(os.environ.get('XIEBO_LOG_ROTATE_BYTES', str(256 * 1024 * 1024)))
+STRUCTURED_INDEX_RECORD = struct.Struct('<qQ')  # batch_id, byte offset
+GPU_STRUCTURED_LOGS = {}
+GPU_STRUCTURED_LOGS_LOCK = threading.Lock()
+
+# Multi-process worker mode (XIEBO_WORKER_MODE=process)
+WORKER_MODE = os.environ.get('XIEBO_WORKER_MODE', 'thread').strip().lower()
+WORKER_HEARTBEAT_TIMEOUT = int(os.environ.get('XIEBO_HEARTBEAT_TIMEOUT', '900'))
+WORKER_MAX_RESTART_DELAY = 60
+STATUS_BOARD = None           # set inside worker processes
+SHARED_BATCH_COUNTER = None   # multiprocessing.Value shared by worker processes
+
+# DB-free local sweep (--sweep)
+SWEEP_CHUNK_BITS = int(os.environ.get('XIEBO_SWEEP_CHUNK_BITS', '36'))
+SWEEP_STATE_FILE = os.environ.get('XIEBO_SWEEP_STATE', '')
+
+# Preflight stamp cache (XIEBO_PREFLIGHT=force re-runs every check)
+PREFLIGHT_CACHE_FILE = os.environ.get(
+    'XIEBO_PREFLIGHT_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'xiebo', 'preflight.json'))
+PREFLIGHT_FORCE = os.environ.get('XIEBO_PREFLIGHT', '').strip().lower() == 'force'
+PREFLIGHT_PACKAGES = ('cryptography',)     # config decryption, every mode
+PREFLIGHT_DB_PACKAGES = ('pyodbc',)        # plus the msodbcsql17 driver, SQL Server modes only
+DB_FREE_MODES = ('--sweep', '--calibrate')
+XIEBO_BINARY = "./log"
+BINARY_READY = threading.Event()
+BINARY_OK = False
+BINARY_CHECK_THREAD = None
+
+# Elastic worker pool and control socket (thread mode)
+CONTROL_SOCKET = os.environ.get('XIEBO_CONTROL_SOCKET', os.path.join(LOG_DIR, "control.sock"))
+PREFETCH_DEPTH = int(os.environ.get('XIEBO_PREFETCH_DEPTH', '0'))
+WORKERS = {}                  # gpu_id -> WorkerControl
+WORKERS_LOCK = threading.Lock()
+ACTIVE_CHILDREN = {}          # gpu_id -> running ./log Popen
+RETURNED_BATCH_IDS = []       # claimed but never run, handed out again first
+
+# Per-batch performance records (columns added by --db-maint perf)
+PERF_COLUMNS = (
+    # name, SQL Server type, SQLite type
+    ('run_host', 'NVARCHAR(64)', 'TEXT'),
+    ('run_gpu', 'INT', 'INTEGER'),
+    ('run_seconds', 'FLOAT', 'REAL'),
+    ('keys_scanned', 'BIGINT', 'INTEGER'),
+    ('keys_per_sec', 'FLOAT', 'REAL'),       # keys_scanned / run_seconds, launch overhead included
+    ('gpu_keys_per_sec', 'FLOAT', 'REAL'),   # mean rate the binary reported while scanning
+)
+PERF_REPORT_HOURS = 24
+
+# GPU calibration on a throwaway range before real work (XIEBO_CALIBRATE=1)
+CALIBRATE = os.environ.get('XIEBO_CALIBRATE', '0') == '1'
+CALIBRATION_BITS = int(os.environ.get('XIEBO_CALIBRATION_BITS', '28'))
+CALIBRATION_INTERVAL = float(os.environ.get('XIEBO_CALIBRATION_INTERVAL', '3600'))   # 0 = only at start
+CALIBRATION_RETRY = float(os.environ.get('XIEBO_CALIBRATION_RETRY', '300'))         # 0 = failed GPU leaves
+CALIBRATION_TIMEOUT = float(os.environ.get('XIEBO_CALIBRATION_TIMEOUT', '300'))
+CALIBRATION_MIN_MKEYS = float(os.environ.get('XIEBO_MIN_RATE_MKEYS', '0'))
+TARGET_BATCH_SECONDS = float(os.environ.get('XIEBO_TARGET_BATCH_SECONDS', '3600'))
+GPU_CALIBRATION = {}          # gpu_id -> last calibrate_gpu() result
+
+# Claim order for --batch-db (see ClaimOrder)
+CLAIM_POLICIES = ('sequential', 'sharded', 'strided', 'random', 'priority')
+CLAIM_POLICY = os.environ.get('XIEBO_CLAIM_POLICY', 'sequential').strip().lower()
+CLAIM_HOST_COUNT = int(os.environ.get('XIEBO_HOST_COUNT', '1'))
+CLAIM_HOST_INDEX = os.environ.get('XIEBO_HOST_INDEX', '')     # default: hash of the hostname
+CLAIM_WINDOW = int(os.environ.get('XIEBO_CLAIM_WINDOW', '1024'))
+CLAIM_PRIORITY_COLUMN = os.environ.get('XIEBO_PRIORITY_COLUMN', 'priority')
+CLAIM_ORDER = None            # None = plain ascending counter from START_ID
+
+# Graceful drain (SIGUSR1 or 'drain' control command)
+DRAIN_REQUESTED = threading.Event()
+DRAIN_DEADLINE = float(os.environ.get('XIEBO_DRAIN_DEADLINE', '0'))   # seconds, 0 = wait for every child
+DRAIN_STARTED_AT = 0.0
+DRAIN_REQUEUED = {}           # batch_id -> status to restore when its child is aborted (never 'inprogress')
+DRAIN_STATS = {'finished': 0, 'requeued': 0}
+DRAIN_LOCK = threading.Lock()
+PENDING_STATUS_WRITES = []    # (batch_id, status, found, wif, perf) that failed twice
+PENDING_STATUS_LOCK = threading.Lock()
+
 # =============================================
 # INITIALIZE ENCRYPTED CONFIG
 # =============================================
@@ -180,9 +283,32 @@ def safe_print(message):
     with PRINT_LOCK:
         print(message)
 
-def check_and_install_dependencies():
-    """Install required dependencies"""
-    pip_packages = ['pyodbc', 'cryptography']
+def metric_inc(name, value=1):
+    """Increment an exported counter, e.g. metric_inc('db_retries_total')"""
+    with METRICS_LOCK:
+        METRICS[name] = METRICS.get(name, 0) + value
+
+def write_metrics_file():
+    """Export counters for the node_exporter textfile collector"""
+    with METRICS_LOCK:
+        snapshot = sorted(METRICS.items())
+    try:
+        tmp_file = METRICS_FILE + ".tmp"
+        typed = set()
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for name, value in snapshot:
+                base_name = name.split('{', 1)[0]
+                if base_name not in typed:
+                    f.write(f"# TYPE xiebo_{base_name} counter\n")
+                    typed.add(base_name)
+                f.write(f"xiebo_{name} {value}\n")
+        os.replace(tmp_file, METRICS_FILE)
+    except:
+        pass
+
+def check_and_install_dependencies(need_db=True):
+    """Install required dependencies (the SQL Server driver only if need_db)"""
+    pip_packages = list(PREFLIGHT_PACKAGES) + (list(PREFLIGHT_DB_PACKAGES) if need_db else [])
     system = platform.system().lower()
     
     try:
@@ -197,7 +323,7 @@ def check_and_install_dependencies():
                     stderr=subprocess.DEVNULL
                 )
         
-        if system == "linux":
+        if system == "linux" and need_db:
             result = subprocess.run(["dpkg", "-l", "msodbcsql17"], capture_output=True, text=True)
             if result.returncode != 0 or "msodbcsql17" not in result.stdout:
                 try:
@@ -224,7 +350,7 @@ def check_and_install_dependencies():
 
 def check_and_download_xiebo():
     
-    xiebo_path = "./log"
+    xiebo_path = XIEBO_BINARY
     if os.path.exists(xiebo_path):
         if not os.access(xiebo_path, os.X_OK):
             try:
@@ -233,24 +359,123 @@ def check_and_download_xiebo():
                 pass
         return True
     
+    url = DOWNLOAD_URL
     try:
+        import ssl
+        import urllib.request
         # Use encrypted URL
-        url = DOWNLOAD_URL
         ssl_context = ssl.create_default_context()
         ssl_context.check_hostname = False
         ssl_context.verify_mode = ssl.CERT_NONE
         
-        with urllib.request.urlopen(url, context=ssl_context) as response:
-            with open(xiebo_path, 'wb') as f:
-                f.write(response.read())
-        
-        os.chmod(xiebo_path, 0o755)
+        # Download beside the target and rename, so an interrupted run never
+        # leaves a truncated binary that the next launch would accept
+        tmp_path = f"{xiebo_path}.part.{os.getpid()}"
+        try:
+            with urllib.request.urlopen(url, context=ssl_context) as response:
+                with open(tmp_path, 'wb') as f:
+                    f.write(response.read())
+            os.chmod(tmp_path, 0o755)
+            os.replace(tmp_path, xiebo_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
         return True
     except Exception as e:
         safe_print(f"❌ Download error: {e}")
         safe_print(f"   URL: {url[:50]}..." if len(url) > 50 else f"   URL: {url}")
         return False
 
+# =============================================
+# PREFLIGHT CACHE
+# =============================================
+def preflight_key(need_db=True):
+    """Everything the dependency and binary checks depend on, or None if incomplete"""
+    from importlib import metadata
+    key = {
+        'python': sys.executable,
+        'version': sys.version,
+        'platform': platform.platform(),
+        'db': need_db,
+    }
+    for package in PREFLIGHT_PACKAGES + (PREFLIGHT_DB_PACKAGES if need_db else ()):
+        try:
+            key[package] = metadata.version(package)
+        except Exception:
+            return None
+    if need_db and platform.system().lower() == "linux":
+        try:
+            # Any apt/dpkg install or removal rewrites this file
+            key['dpkg_status_mtime'] = os.stat('/var/lib/dpkg/status').st_mtime_ns
+        except OSError:
+            key['dpkg_status_mtime'] = None
+    try:
+        st = os.stat(XIEBO_BINARY)
+        if not os.access(XIEBO_BINARY, os.X_OK):
+            return None
+        key['binary'] = [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
+    return key
+
+def load_preflight_stamp():
+    try:
+        with open(PREFLIGHT_CACHE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except:
+        return None
+
+def write_preflight_stamp(key):
+    try:
+        os.makedirs(os.path.dirname(PREFLIGHT_CACHE_FILE), exist_ok=True)
+        tmp_file = PREFLIGHT_CACHE_FILE + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(key, f)
+        os.replace(tmp_file, PREFLIGHT_CACHE_FILE)
+    except:
+        pass
+
+def run_preflight(need_db=True):
+    """Dependency and binary checks, skipped when nothing changed since the last pass.
+    
+    Dependencies are checked inline because claiming a batch needs pyodbc.
+    The binary check (and possible download) runs in the background; workers
+    claim their first batch meanwhile and only wait for it in run_xiebo.
+    need_db=False (--sweep, SQLite) leaves pyodbc and the ODBC driver alone.
+    """
+    global BINARY_OK, BINARY_CHECK_THREAD
+    key = preflight_key(need_db)
+    if key is not None and not PREFLIGHT_FORCE and load_preflight_stamp() == key:
+        BINARY_OK = True
+        BINARY_READY.set()
+        return
+    
+    check_and_install_dependencies(need_db)
+    
+    def binary_check():
+        global BINARY_OK, STOP_SEARCH_FLAG
+        BINARY_OK = check_and_download_xiebo()
+        BINARY_READY.set()
+        if BINARY_OK:
+            fresh_key = preflight_key(need_db)
+            if fresh_key is not None:
+                write_preflight_stamp(fresh_key)
+        else:
+            with STOP_SEARCH_FLAG_LOCK:
+                STOP_SEARCH_FLAG = True
+    BINARY_CHECK_THREAD = threading.Thread(target=binary_check, daemon=True)
+    BINARY_CHECK_THREAD.start()
+
+def wait_for_binary():
+    """Block until the background binary check is finished"""
+    BINARY_READY.wait()
+    return BINARY_OK
+
+def finish_binary_check():
+    """Let a started binary check (download + stamp) complete before exiting"""
+    if BINARY_CHECK_THREAD is not None:
+        BINARY_CHECK_THREAD.join()
+
 def ensure_log_dir():
     """Create log directory if not exists"""
     if not os.path.exists(LOG_DIR):
@@ -264,12 +489,13 @@ def get_gpu_log_file(gpu_id):
         GPU_LOG_FILES[gpu_id] = log_file
     return GPU_LOG_FILES[gpu_id]
 
-def log_xiebo_output(gpu_id, message):
+def log_xiebo_output(gpu_id, message, batch_id=None, event='output'):
     """Log output to file"""
     log_file = get_gpu_log_file(gpu_id)
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     with open(log_file, 'a', encoding='utf-8') as f:
         f.write(f"[{timestamp}] {message}\n")
+    log_structured(gpu_id, batch_id, event, message)
 
 def remove_sensitive_lines(gpu_id):
     """Remove sensitive information from logs"""
@@ -319,89 +545,874 @@ def show_log_preview(gpu_id, range_info="N/A", is_special_address=False):
         safe_print(f"[GPU {gpu_id}] ❌ Error reading log: {e}")
 
 # =============================================
-# DATABASE FUNCTIONS
+# STRUCTURED LOGS
 # =============================================
-def connect_db():
-    """Connect to database"""
+class StructuredLog:
+    """Per-GPU JSON-lines log plus a sidecar index of (batch_id, offset).
+    
+    One index record is appended whenever the batch id changes, pointing
+    at that batch's first JSON record. Segments rotate only at batch
+    boundaries, so a batch's records are contiguous within one segment.
+    """
+    def __init__(self, gpu_id, log_dir=LOG_DIR, rotate_bytes=STRUCTURED_LOG_ROTATE_BYTES):
+        self.gpu_id = gpu_id
+        self.log_dir = log_dir
+        self.rotate_bytes = rotate_bytes
+        self.stem = f"gpu_{gpu_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.segment = -1
+        self.last_batch = None
+        self.log_f = None
+        self.idx_f = None
+        self.lock = threading.Lock()
+        self._open_next_segment()
+    
+    def _open_next_segment(self):
+        self.close()
+        self.segment += 1
+        base = os.path.join(self.log_dir, f"{self.stem}_{self.segment:04d}")
+        self.log_f = open(base + ".jsonl", 'ab')
+        self.idx_f = open(base + ".idx", 'ab')
+        self.last_batch = None
+    
+    def write(self, batch_id, event, message='', **fields):
+        record = {
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'gpu': self.gpu_id,
+            'batch': batch_id,
+            'event': event,
+        }
+        if message:
+            record['msg'] = redact_private_keys(message)
+        record.update(fields)
+        line = (json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8')
+        
+        with self.lock:
+            if batch_id != self.last_batch:
+                if self.log_f.tell() >= self.rotate_bytes:
+                    self._open_next_segment()
+                if batch_id is not None:
+                    self.idx_f.write(STRUCTURED_INDEX_RECORD.pack(int(batch_id), self.log_f.tell()))
+                    self.idx_f.flush()
+                self.last_batch = batch_id
+            self.log_f.write(line)
+            self.log_f.flush()
+    
+    def close(self):
+        for f in (self.log_f, self.idx_f):
+            if f:
+                try:
+                    f.close()
+                except:
+                    pass
+
+def redact_private_keys(message):
+    """Private keys never go to the structured log"""
+    lower = message.lower()
+    if 'priv (wif):' in lower or 'priv (hex):' in lower:
+        return message.split(':', 1)[0] + ': [redacted]'
+    return message
+
+def log_structured(gpu_id, batch_id, event, message='', **fields):
+    """Append one JSON record for a GPU event"""
+    if not STRUCTURED_LOGS:
+        return
     try:
-        import pyodbc
-        conn = pyodbc.connect(
-            "DRIVER={ODBC Driver 17 for SQL Server};"
-            f"SERVER={SERVER};"
-            f"DATABASE={DATABASE};"
-            f"UID={USERNAME};"
-            f"PWD={PASSWORD};"
-            "Encrypt=no;TrustServerCertificate=yes;Connection Timeout=30;",
-            autocommit=False
-        )
-        return conn
+        with GPU_STRUCTURED_LOGS_LOCK:
+            slog = GPU_STRUCTURED_LOGS.get(gpu_id)
+            if slog is None:
+                slog = GPU_STRUCTURED_LOGS[gpu_id] = StructuredLog(gpu_id)
+        slog.write(batch_id, event, message, **fields)
     except Exception as e:
-        safe_print(f"❌ Database connection error: {e}")
-        return None
+        safe_print(f"[GPU {gpu_id}] ⚠️ Structured log error: {e}")
 
-def get_batch_by_id(batch_id):
-    """Get batch information by ID"""
-    conn = connect_db()
-    if not conn:
-        return None
+def query_structured_logs(batch_id, log_dir=LOG_DIR):
+    """Yield every JSON record for a batch, seeking via the .idx sidecars"""
+    batch_id = int(batch_id)
+    for idx_file in sorted(glob.glob(os.path.join(log_dir, "*.idx"))):
+        try:
+            with open(idx_file, 'rb') as f:
+                index_data = f.read()
+        except OSError:
+            continue
+        usable = len(index_data) - len(index_data) % STRUCTURED_INDEX_RECORD.size
+        offsets = [off for bid, off in STRUCTURED_INDEX_RECORD.iter_unpack(index_data[:usable]) if bid == batch_id]
+        if not offsets:
+            continue
+        with open(idx_file[:-4] + ".jsonl", 'rb') as log_f:
+            for offset in offsets:
+                log_f.seek(offset)
+                for raw in log_f:
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        break
+                    if record.get('batch') != batch_id:
+                        break
+                    yield record
+
+# =============================================
+# DATABASE FUNCTIONS
+# =============================================
+class TransientDBError(Exception):
+    """Connection or query failure that may succeed on retry"""
+
+class PermanentDBError(Exception):
+    """Failure that retrying will not fix (bad SQL, missing table, bad login)"""
+
+class CircuitOpenError(TransientDBError):
+    """Raised without touching the database while the circuit is open"""
+    def __init__(self, retry_after):
+        super().__init__(f"circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+# SQLSTATE prefixes: 08 = connection, HYT = timeout, 40001 = deadlock victim
+TRANSIENT_SQLSTATES = ('08', 'HYT', '40001')
+# IM = driver/DSN, 28 = login, 42 = syntax or missing object
+PERMANENT_SQLSTATES = ('IM', '28', '42')
+
+def classify_db_error(error):
+    """Wrap a driver exception as TransientDBError or PermanentDBError"""
+    if isinstance(error, (TransientDBError, PermanentDBError)):
+        return error
+    sqlstate = str(error.args[0]) if error.args else ''
+    if sqlstate.startswith(PERMANENT_SQLSTATES):
+        return PermanentDBError(error)
+    if sqlstate.startswith(TRANSIENT_SQLSTATES):
+        return TransientDBError(error)
+    if type(error).__module__ == 'sqlite3':
+        message = str(error).lower()
+        if 'locked' in message or 'busy' in message:
+            return TransientDBError(error)
+        return PermanentDBError(error)
+    if isinstance(error, OSError) or type(error).__name__ in ('OperationalError', 'InterfaceError'):
+        return TransientDBError(error)
+    return PermanentDBError(error)
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures, probes again after a cool-down"""
+    def __init__(self, failure_threshold=DB_CIRCUIT_FAILURE_THRESHOLD, reset_timeout=DB_CIRCUIT_RESET_TIMEOUT,
+                 clock=time.monotonic, announce=True):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.announce = announce
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.lock = threading.Lock()
     
-    try:
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT id, start_range, end_range, status, found, wif FROM {TABLE} WHERE id = ?", (batch_id,))
-        row = cursor.fetchone()
-        if row:
-            columns = [column[0] for column in cursor.description]
-            batch = dict(zip(columns, row))
-        else:
-            batch = None
-        cursor.close()
-        conn.close()
-        return batch
-    except Exception as e:
-        safe_print(f"❌ Error getting batch: {e}")
-        if conn:
-            conn.close()
-        return None
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go through now"""
+        with self.lock:
+            if self.state == 'open':
+                remaining = self.opened_at + self.reset_timeout - self.clock()
+                if remaining > 0:
+                    metric_inc('db_circuit_rejected_total')
+                    raise CircuitOpenError(remaining)
+                self._transition('half_open')
+            if self.state == 'half_open':
+                # Only one probe at a time; everyone else waits for its verdict
+                if self.probe_in_flight:
+                    metric_inc('db_circuit_rejected_total')
+                    raise CircuitOpenError(1.0)
+                self.probe_in_flight = True
+    
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            if self.state != 'closed':
+                self._transition('closed')
+    
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                if self.state != 'open':
+                    self._transition('open')
+    
+    def release(self):
+        """End a call that neither proves nor disproves DB health"""
+        with self.lock:
+            self.probe_in_flight = False
+    
+    def _transition(self, state):
+        self.state = state
+        metric_inc(f'db_circuit_transitions_total{{state="{state}"}}')
+        if not self.announce:
+            return
+        if state == 'open':
+            safe_print(f"⚠️ Database circuit OPEN after {self.failures} failures, pausing DB calls for {self.reset_timeout}s")
+        elif state == 'closed':
+            safe_print("✅ Database circuit closed, DB calls resumed")
 
-def update_batch_status(batch_id, status, found='No', wif='', silent_mode=False):
-    """Update batch status in database with timestamp"""
-    conn = connect_db()
-    if not conn:
-        return False
+class BatchDB:
+    """Batch table access with jittered exponential backoff and a shared circuit breaker"""
+    def __init__(self, breaker=None, attempts=DB_RETRY_ATTEMPTS,
+                 base_delay=DB_RETRY_BASE_DELAY, max_delay=DB_RETRY_MAX_DELAY):
+        self.breaker = breaker or CircuitBreaker()
+        self.archive_exists = False
+        self.perf_columns = None      # unknown until the first write with perf data
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
     
-    try:
-        cursor = conn.cursor()
+    def backoff_delay(self, attempt):
+        """Full-jitter backoff: uniform(0, min(max_delay, base * 2^attempt))"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+    
+    def execute(self, fn):
+        """Run fn(cursor) in its own transaction, retrying transient failures"""
+        last_error = None
+        for attempt in range(self.attempts):
+            self.breaker.before_call()
+            try:
+                result = self._run_once(fn)
+            except Exception as e:
+                error = classify_db_error(e)
+                if isinstance(error, PermanentDBError):
+                    self.breaker.release()
+                    metric_inc('db_permanent_errors_total')
+                    raise error from e
+                self.breaker.record_failure()
+                metric_inc('db_transient_errors_total')
+                last_error = error
+                if attempt + 1 < self.attempts:
+                    metric_inc('db_retries_total')
+                    time.sleep(self.backoff_delay(attempt))
+                continue
+            self.breaker.record_success()
+            return result
+        metric_inc('db_retries_exhausted_total')
+        raise last_error
+    
+    def _run_once(self, fn):
+        conn = connect_db()
+        try:
+            cursor = conn.cursor()
+            result = fn(cursor)
+            conn.commit()
+            cursor.close()
+            return result
+        except:
+            try:
+                conn.rollback()
+            except:
+                pass
+            raise
+        finally:
+            try:
+                conn.close()
+            except:
+                pass
+    
+    def get_batch(self, batch_id):
+        """Return the batch row as a dict, or None if the id does not exist.
         
-        # Update status, found, wif, and start_tm (timestamp)
-        if status == 'inprogress':
-            # Set start_tm to current datetime when starting progress
+        Rows moved to the archive table by --db-maint still count as 'done',
+        so archiving never looks like end of work to a worker.
+        """
+        def query(cursor):
+            if self.archive_exists:
+                cursor.execute(f"""
+                    SELECT id, start_range, end_range, status, found, wif FROM {TABLE} WHERE id = ?
+                    UNION ALL
+                    SELECT id, start_range, end_range, 'done', found, wif FROM {archive_table_name()} WHERE id = ?
+                """, (batch_id, batch_id))
+            else:
+                cursor.execute(f"SELECT id, start_range, end_range, status, found, wif FROM {TABLE} WHERE id = ?", (batch_id,))
+            row = cursor.fetchone()
+            if not row:
+                if not self.archive_exists and table_exists(cursor, archive_table_name()):
+                    self.archive_exists = True
+                    return query(cursor)
+                return None
+            columns = [column[0] for column in cursor.description]
+            return dict(zip(columns, row))
+        return self.execute(query)
+    
+    def id_bounds(self):
+        """(MIN(id), MAX(id)) of the live table, (None, None) when empty"""
+        def query(cursor):
+            cursor.execute(f"SELECT MIN(id), MAX(id) FROM {TABLE}")
+            return tuple(cursor.fetchone())
+        return self.execute(query)
+    
+    def open_ids(self, lo, hi, limit, retried_since=None):
+        """Up to limit runnable ids in [lo, hi], ascending, in one query.
+        retried_since also leaves out 'error' rows stamped at or after it
+        (they already had their retry in this run)."""
+        where = "id BETWEEN ? AND ? AND (status IS NULL OR status NOT IN ('done', 'inprogress'))"
+        params = (lo, hi)
+        if retried_since is not None:
+            where += " AND NOT (status = 'error' AND start_tm >= ?)"
+            params += (retried_since,)
+        def query(cursor):
+            if SQLITE_DB:
+                cursor.execute(f"SELECT id FROM {TABLE} WHERE {where} ORDER BY id LIMIT ?", params + (limit,))
+            else:
+                cursor.execute(f"SELECT TOP (?) id FROM {TABLE} WHERE {where} ORDER BY id", (limit,) + params)
+            return [row[0] for row in cursor.fetchall()]
+        metric_inc('claim_range_queries_total')
+        return self.execute(query)
+    
+    def db_now(self):
+        """The database clock (start_tm is stamped with it)"""
+        def query(cursor):
+            cursor.execute("SELECT GETDATE()")
+            return cursor.fetchone()[0]
+        return self.execute(query)
+    
+    def ids_by_priority(self, column, first_id):
+        """Unfinished ids >= first_id, highest priority first"""
+        def query(cursor):
             cursor.execute(f"""
-                UPDATE {TABLE} 
-                SET status = ?, found = ?, wif = ?, start_tm = GETDATE() 
-                WHERE id = ?
-            """, (status, found, wif, batch_id))
-        else:
-            # For done, error, and other statuses - update with timestamp
+                SELECT id FROM {TABLE}
+                WHERE id >= ? AND (status IS NULL OR status <> 'done')
+                ORDER BY {column} DESC, id
+            """, (first_id,))
+            return [row[0] for row in cursor.fetchall()]
+        return self.execute(query)
+    
+    def update_status(self, batch_id, status, found='No', wif='', perf=None):
+        """Update status, found, wif and start_tm (timestamp).
+        
+        perf (see batch_perf) rides along in the same UPDATE when the table
+        has the PERF_COLUMNS; otherwise it is dropped.
+        """
+        def query(cursor):
+            if perf and self.perf_columns is None:
+                self.perf_columns = has_perf_columns(cursor, TABLE)
+            extra_sql, extra_args = "", ()
+            if perf and self.perf_columns:
+                names = [name for name, _, _ in PERF_COLUMNS]
+                extra_sql = "".join(f", {name} = ?" for name in names)
+                extra_args = tuple(perf.get(name) for name in names)
             cursor.execute(f"""
                 UPDATE {TABLE} 
-                SET status = ?, found = ?, wif = ?, start_tm = GETDATE()
+                SET status = ?, found = ?, wif = ?, start_tm = GETDATE(){extra_sql}
                 WHERE id = ?
-            """, (status, found, wif, batch_id))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+            """, (status, found, wif) + extra_args + (batch_id,))
+        self.execute(query)
+
+def connect_db():
+    """Connect to database (raises on failure, see classify_db_error)"""
+    if SQLITE_DB:
+        import sqlite3
+        # Attached as 'dbo' so schema-qualified names like dbo.Tbatch resolve
+        conn = sqlite3.connect(':memory:', timeout=30)
+        conn.execute("ATTACH DATABASE ? AS dbo", (SQLITE_DB,))
+        conn.create_function('GETDATE', 0, lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        return conn
+    import pyodbc
+    return pyodbc.connect(
+        "DRIVER={ODBC Driver 17 for SQL Server};"
+        f"SERVER={SERVER};"
+        f"DATABASE={DATABASE};"
+        f"UID={USERNAME};"
+        f"PWD={PASSWORD};"
+        "Encrypt=no;TrustServerCertificate=yes;Connection Timeout=30;",
+        autocommit=False
+    )
+
+def archive_table_name():
+    return f"{TABLE}_archive"
+
+def split_table_name(name):
+    """'dbo.Tbatch' -> ('dbo', 'Tbatch')"""
+    schema, _, table = name.rpartition('.')
+    return schema or 'dbo', table
+
+def table_columns(cursor, name):
+    """Lower-cased column names of a table"""
+    if SQLITE_DB:
+        schema, table = split_table_name(name)
+        cursor.execute(f"PRAGMA {schema}.table_info({table})")
+        return {row[1].lower() for row in cursor.fetchall()}
+    cursor.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?)", (name,))
+    return {row[0].lower() for row in cursor.fetchall()}
+
+def has_perf_columns(cursor, name):
+    return all(column in table_columns(cursor, name) for column, _, _ in PERF_COLUMNS)
+
+def table_exists(cursor, name):
+    if SQLITE_DB:
+        schema, table = split_table_name(name)
+        cursor.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    else:
+        cursor.execute("SELECT 1 WHERE OBJECT_ID(?, 'U') IS NOT NULL", (name,))
+    return cursor.fetchone() is not None
+
+BATCH_DB = BatchDB()
+
+def get_batch_by_id(batch_id):
+    """Get batch information by ID.
+    
+    Returns None only when the row does not exist (end of work). Connection
+    and query failures raise TransientDBError / PermanentDBError instead.
+    """
+    return BATCH_DB.get_batch(batch_id)
+
+def wait_for_batch(gpu_id, batch_id):
+    """Get a batch, pausing through DB outages instead of giving up"""
+    paused = False
+    while True:
+        if stop_requested():
+            return None
+        try:
+            batch = get_batch_by_id(batch_id)
+        except TransientDBError as e:
+            delay = e.retry_after if isinstance(e, CircuitOpenError) else BATCH_DB.backoff_delay(3)
+            if not paused:
+                paused = True
+                board_publish(gpu_id, phase='db_wait')
+                metric_inc('worker_db_pauses_total')
+                safe_print(f"[GPU {gpu_id}] ⏸️ Database unavailable ({e}), pausing at batch {batch_id}...")
+            time.sleep(min(max(delay, 1.0), DB_RETRY_MAX_DELAY))
+            continue
+        if paused:
+            safe_print(f"[GPU {gpu_id}] ▶️ Database back, resuming at batch {batch_id}")
+        return batch
+
+def wait_for_open_ids(lo, hi, limit, retried_since=None):
+    """BATCH_DB.open_ids, pausing through DB outages; None once stopping"""
+    while not stop_requested():
+        try:
+            return BATCH_DB.open_ids(lo, hi, limit, retried_since)
+        except TransientDBError as e:
+            delay = e.retry_after if isinstance(e, CircuitOpenError) else BATCH_DB.backoff_delay(3)
+            time.sleep(min(max(delay, 1.0), DB_RETRY_MAX_DELAY))
+    return None
+
+def update_batch_status(batch_id, status, found='No', wif='', silent_mode=False, perf=None):
+    """Update batch status in database with timestamp"""
+    try:
+        BATCH_DB.update_status(batch_id, status, found, wif, perf)
         return True
     except Exception as e:
         if not silent_mode:
             safe_print(f"[BATCH {batch_id}] ❌ DB Update Error: {e}")
-        if conn:
+        return False
+
+# =============================================
+# LOCAL SWEEP SOURCE
+# =============================================
+class LocalSweepSource:
+    """Stands in for BatchDB: hex ranges cut into 2^chunk_bits chunks.
+    
+    Chunk ids play the role of batch ids, so gpu_worker, claim_batch_id and
+    run_xiebo work unchanged. Ranges are read lazily, so a stream on stdin
+    can keep feeding work. Progress goes to a JSON state file as a
+    'done_below' watermark plus the done ids above it, and is resumed when
+    the input signature matches. A ranges file is signed by its contents;
+    stdin cannot be signed, so it only resumes from an explicit state file.
+    """
+    def __init__(self, range_lines, signature, chunk_bits=SWEEP_CHUNK_BITS, state_file=None, resume=True):
+        self.range_lines = range_lines
+        self.chunk_bits = chunk_bits
+        self.signature = f"{signature}|{chunk_bits}"
+        digest = hashlib.sha256(self.signature.encode()).hexdigest()[:12]
+        self.state_file = state_file or os.path.join(LOG_DIR, f"sweep_{digest}.json")
+        self.ranges = []          # (first_chunk_id, start_int, end_int, chunk_count)
+        self.total_chunks = 0
+        self.exhausted = False
+        self.done = set()
+        self.done_below = 0
+        self.status = {}          # chunk id -> 'inprogress' / 'error' for this run
+        self.found = []
+        self.lock = threading.Lock()          # state: status, done, ranges
+        self.read_lock = threading.Lock()     # input: may block on stdin, never held with self.lock
+        if resume:
+            self._load_state()
+    
+    @classmethod
+    def from_bounds(cls, start_hex, end_hex, **kwargs):
+        source = cls(iter([f"{start_hex} {end_hex}"]), f"bounds:{start_hex.upper()}-{end_hex.upper()}", **kwargs)
+        source._read_more()
+        source.exhausted = True
+        return source
+    
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        if path == '-':
+            if kwargs.get('state_file'):
+                safe_print("⚠️ Resuming stdin from XIEBO_SWEEP_STATE: feed the same ranges in the same order")
+                return cls(sys.stdin, "stdin", **kwargs)
+            # Nothing identifies the stream, so never pick up another run's progress
+            fresh = f"stdin:{os.getpid()}:{time.time()}"
+            return cls(sys.stdin, fresh, resume=False, **kwargs)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return cls(open(path, 'r', encoding='utf-8'), f"file:{digest.hexdigest()}", **kwargs)
+    
+    def _load_state(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            safe_print(f"⚠️ Ignoring unreadable sweep state {self.state_file}: {e}")
+            return
+        if state.get('signature') != self.signature:
+            safe_print(f"⚠️ Sweep state {self.state_file} belongs to another input, starting fresh")
+            return
+        self.done_below = int(state.get('done_below', 0))
+        self.done = set(state.get('done', []))
+        self.found = state.get('found', [])
+    
+    def _save_state(self):
+        while self.done_below in self.done:
+            self.done.discard(self.done_below)
+            self.done_below += 1
+        state = {
+            'signature': self.signature,
+            'done_below': self.done_below,
+            'done': sorted(self.done),
+            'found': self.found,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+        }
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_file)
+    
+    def _read_more(self):
+        """Pull ranges from the input until one more chunk exists (read_lock held)"""
+        for line in self.range_lines:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = line.replace(':', ' ').replace('-', ' ').split()
+            if len(parts) != 2:
+                safe_print(f"⚠️ Skipping malformed range line: {line}")
+                continue
             try:
-                conn.rollback()
-            except:
-                pass
-            conn.close()
+                start_int, end_int = int(parts[0], 16), int(parts[1], 16)
+            except ValueError:
+                safe_print(f"⚠️ Skipping malformed range line: {line}")
+                continue
+            if end_int < start_int:
+                safe_print(f"⚠️ Skipping empty range: {line}")
+                continue
+            count = ((end_int - start_int) >> self.chunk_bits) + 1
+            with self.lock:
+                self.ranges.append((self.total_chunks, start_int, end_int, count))
+                self.total_chunks += count
+            return True
+        with self.lock:
+            self.exhausted = True
         return False
+    
+    def _locate(self, chunk_id):
+        lo, hi = 0, len(self.ranges) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.ranges[mid][0] <= chunk_id:
+                lo = mid
+            else:
+                hi = mid - 1
+        return self.ranges[lo]
+    
+    def is_done(self, chunk_id):
+        return chunk_id < self.done_below or chunk_id in self.done
+    
+    def get_batch(self, batch_id):
+        """Chunk as a batch row, or None once the input is exhausted"""
+        # Waiting for input must not block update_status / progress on other GPUs
+        with self.read_lock:
+            while True:
+                with self.lock:
+                    if batch_id < self.total_chunks or self.exhausted:
+                        break
+                self._read_more()
+        with self.lock:
+            if batch_id < 0 or batch_id >= self.total_chunks:
+                return None
+            first_id, start_int, end_int, _ = self._locate(batch_id)
+            chunk_start = start_int + ((batch_id - first_id) << self.chunk_bits)
+            chunk_end = min(end_int, chunk_start + (1 << self.chunk_bits) - 1)
+            status = 'done' if self.is_done(batch_id) else self.status.get(batch_id)
+            return {
+                'id': batch_id,
+                'start_range': f"{chunk_start:016X}",
+                'end_range': f"{chunk_end:016X}",
+                'status': status,
+                'found': 'No',
+                'wif': '',
+            }
+    
+    def update_status(self, batch_id, status, found='No', wif='', perf=None):
+        with self.lock:
+            if status == 'done':
+                self.status.pop(batch_id, None)
+                self.done.add(batch_id)
+            else:
+                self.status[batch_id] = status
+            if found == 'Yes':
+                self.found.append({'chunk': batch_id, 'wif': wif})
+            if status in ('done', 'error') or found == 'Yes':
+                self._save_state()
+    
+    def progress(self):
+        with self.lock:
+            done = self.done_below + len(self.done)
+            total = f"{self.total_chunks}" + ("" if self.exhausted else "+")
+            return done, total
+
+# =============================================
+# BATCH TABLE MAINTENANCE
+# =============================================
+ARCHIVE_CHUNK_ROWS = int(os.environ.get('XIEBO_ARCHIVE_CHUNK', '1000'))
+ARCHIVE_CHUNK_PAUSE = float(os.environ.get('XIEBO_ARCHIVE_PAUSE', '0.2'))
+# Offline builds block every claim for the whole build; opt in explicitly
+ALLOW_OFFLINE_INDEX = os.environ.get('XIEBO_ALLOW_OFFLINE_INDEX', '0') == '1'
+
+def claim_path_indexes():
+    """(name, key columns, included columns) the claim path relies on"""
+    _, table = split_table_name(TABLE)
+    return [
+        # id lookups: covering, so a claim probe never touches the base row
+        (f"IX_{table}_id", "id", "start_range, end_range, status, found, wif"),
+        # status scans: archiving, status counts and open-row lookups
+        (f"IX_{table}_status_id", "status, id", ""),
+    ]
+
+def ensure_claim_indexes():
+    """Create missing claim-path indexes online; offline only with XIEBO_ALLOW_OFFLINE_INDEX=1"""
+    created = []
+    def query(cursor):
+        schema, table = split_table_name(TABLE)
+        for name, keys, include in claim_path_indexes():
+            if SQLITE_DB:
+                cursor.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'index' AND name = ?", (name,))
+                if cursor.fetchone():
+                    continue
+                # No INCLUDE in SQLite: covered columns become trailing keys
+                columns = f"{keys}, {include}" if include else keys
+                cursor.execute(f"CREATE INDEX {schema}.{name} ON {table} ({columns})")
+                created.append(name)
+                continue
+            
+            cursor.execute("SELECT 1 FROM sys.indexes WHERE object_id = OBJECT_ID(?) AND name = ?", (TABLE, name))
+            if cursor.fetchone():
+                continue
+            if keys == "id":
+                # Skip if the table already has any index leading with id (e.g. the PK)
+                cursor.execute("""
+                    SELECT 1 FROM sys.index_columns ic JOIN sys.columns c
+                      ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+                    WHERE ic.object_id = OBJECT_ID(?) AND ic.key_ordinal = 1 AND c.name = 'id'
+                """, (TABLE,))
+                if cursor.fetchone():
+                    continue
+            ddl = f"CREATE NONCLUSTERED INDEX {name} ON {TABLE} ({keys})"
+            if include:
+                ddl += f" INCLUDE ({include})"
+            try:
+                cursor.execute(ddl + " WITH (ONLINE = ON)")
+            except Exception as e:
+                # ONLINE index builds need Enterprise/Azure
+                if not ALLOW_OFFLINE_INDEX:
+                    safe_print(f"   ⚠️ Skipped {name}: online build rejected ({e}); "
+                               f"set XIEBO_ALLOW_OFFLINE_INDEX=1 to build it offline in a quiet window")
+                    continue
+                safe_print(f"   ⚠️ Building {name} offline: claims on {TABLE} block until it finishes")
+                cursor.execute(ddl)
+            created.append(name)
+    BATCH_DB.execute(query)
+    return created
+
+def ensure_archive_table():
+    archive = archive_table_name()
+    def query(cursor):
+        if table_exists(cursor, archive):
+            return False
+        schema, table = split_table_name(archive)
+        if SQLITE_DB:
+            cursor.execute(f"CREATE TABLE {archive} AS SELECT * FROM {TABLE} WHERE 0")
+            cursor.execute(f"CREATE INDEX {schema}.IX_{table}_id ON {table} (id)")
+        else:
+            # UNION ALL drops the IDENTITY property, so OUTPUT ... INTO works
+            cursor.execute(f"SELECT TOP 0 * INTO {archive} FROM {TABLE} UNION ALL SELECT TOP 0 * FROM {TABLE}")
+            cursor.execute(f"CREATE CLUSTERED INDEX IX_{table}_id ON {archive} (id)")
+        return True
+    return BATCH_DB.execute(query)
+
+def ensure_perf_columns():
+    """Add the PERF_COLUMNS to the batch table (and its archive) where missing"""
+    added = []
+    def query(cursor):
+        tables = [TABLE]
+        if table_exists(cursor, archive_table_name()):
+            tables.append(archive_table_name())
+        for name in tables:
+            existing = table_columns(cursor, name)
+            for column, mssql_type, sqlite_type in PERF_COLUMNS:
+                if column in existing:
+                    continue
+                # Nullable columns without defaults: a metadata-only change on SQL Server
+                cursor.execute(f"ALTER TABLE {name} ADD {column} {sqlite_type if SQLITE_DB else mssql_type} NULL")
+                added.append(f"{name}.{column}")
+    BATCH_DB.execute(query)
+    return added
+
+def archive_done_batches(chunk_rows=ARCHIVE_CHUNK_ROWS, pause=ARCHIVE_CHUNK_PAUSE):
+    """Move 'done' rows to the archive table in small transactions"""
+    archive = archive_table_name()
+    def move_chunk(cursor):
+        if SQLITE_DB:
+            cursor.execute(f"SELECT id FROM {TABLE} WHERE status = 'done' ORDER BY id LIMIT ?", (chunk_rows,))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return 0
+            marks = ",".join("?" * len(ids))
+            cursor.execute(f"INSERT INTO {archive} SELECT * FROM {TABLE} WHERE id IN ({marks})", ids)
+            cursor.execute(f"DELETE FROM {TABLE} WHERE id IN ({marks})", ids)
+            return len(ids)
+        cursor.execute(f"""
+            DELETE TOP (?) FROM {TABLE} WITH (ROWLOCK, READPAST)
+            OUTPUT DELETED.* INTO {archive}
+            WHERE status = 'done'
+        """, (chunk_rows,))
+        return cursor.rowcount
+    
+    moved = 0
+    while True:
+        count = BATCH_DB.execute(move_chunk)
+        if not count or count < 0:
+            return moved
+        moved += count
+        safe_print(f"   📦 Archived {moved} rows...")
+        time.sleep(pause)
+
+def measure_claim_latency(samples=50):
+    """Median and p95 milliseconds for the claim probe and a status count.
+    
+    One connection for all samples, so only execute + fetch is timed,
+    not connect and commit.
+    """
+    lo, hi = BATCH_DB.id_bounds()
+    if lo is None:
+        return None
+    
+    def timed(cursor, sql, make_args):
+        timings = []
+        for _ in range(samples):
+            args = make_args()
+            t0 = time.perf_counter()
+            cursor.execute(sql, args)
+            cursor.fetchall()
+            timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1]
+    
+    try:
+        conn = connect_db()
+        try:
+            cursor = conn.cursor()
+            return {
+                'probe': timed(cursor, f"SELECT id, start_range, end_range, status, found, wif FROM {TABLE} WHERE id = ?",
+                               lambda: (random.randint(lo, hi),)),
+                'status': timed(cursor, f"SELECT COUNT(*) FROM {TABLE} WHERE status = 'inprogress'", tuple),
+            }
+        finally:
+            conn.close()
+    except Exception as e:
+        raise classify_db_error(e) from e
+
+def show_latency(label, latency):
+    if latency is None:
+        safe_print(f"   {label}: table is empty")
+        return
+    safe_print(f"   {label}: id probe {latency['probe'][0]:.2f}ms (p95 {latency['probe'][1]:.2f}ms) | "
+               f"status count {latency['status'][0]:.2f}ms (p95 {latency['status'][1]:.2f}ms)")
+
+def run_db_maintenance(action):
+    """--db-maint indexes|archive|perf|report|all"""
+    safe_print(f"🛠️ Batch table maintenance on {TABLE} ({'SQLite ' + SQLITE_DB if SQLITE_DB else 'SQL Server'})")
+    before = measure_claim_latency()
+    show_latency("Before", before)
+    if action == 'report':
+        return
+    
+    if action in ('indexes', 'all'):
+        created = ensure_claim_indexes()
+        safe_print(f"   🗂️ Indexes created: {', '.join(created) if created else 'none needed'}")
+    if action in ('perf', 'all'):
+        added = ensure_perf_columns()
+        safe_print(f"   📐 Performance columns added: {', '.join(added) if added else 'none needed'}")
+    if action in ('archive', 'all'):
+        if ensure_archive_table():
+            safe_print(f"   🗄️ Created archive table {archive_table_name()}")
+        moved = archive_done_batches()
+        safe_print(f"   📦 Moved {moved} done rows to {archive_table_name()}")
+    
+    show_latency("After ", measure_claim_latency())
+
+# =============================================
+# PERFORMANCE REPORT
+# =============================================
+def perf_rows(group_sql, since):
+    """Aggregate perf records (live and archived) finished after since"""
+    def query(cursor):
+        sources = [TABLE]
+        if table_exists(cursor, archive_table_name()):
+            sources.append(archive_table_name())
+        if not has_perf_columns(cursor, TABLE):
+            raise PermanentDBError(f"{TABLE} has no performance columns (run --db-maint perf)")
+        union = " UNION ALL ".join(
+            f"SELECT run_host, run_gpu, start_tm, run_seconds, keys_scanned, gpu_keys_per_sec FROM {name} "
+            f"WHERE keys_scanned IS NOT NULL AND start_tm >= ?" for name in sources)
+        cursor.execute(f"""
+            SELECT {group_sql} AS label, COUNT(*), SUM(keys_scanned), SUM(run_seconds), AVG(gpu_keys_per_sec)
+            FROM ({union}) p
+            GROUP BY {group_sql}
+            ORDER BY label
+        """, (since,) * len(sources))
+        return [tuple(row) for row in cursor.fetchall()]
+    return BATCH_DB.execute(query)
+
+def show_perf_group(title, rows):
+    safe_print(f"\n{title}")
+    safe_print(f"   {'':<28} {'batches':>8} {'keys':>10} {'MK/s':>9} {'GPU MK/s':>9} {'overhead':>9}")
+    rates = sorted(keys / seconds for _, _, keys, seconds, _ in rows if seconds)
+    median = rates[len(rates) // 2] if rates else 0
+    for label, batches, keys, seconds, gpu_rate in rows:
+        rate = keys / seconds if seconds else 0
+        # Share of wall time not spent scanning: launch, setup and teardown per batch
+        overhead = f"{(1 - rate / gpu_rate) * 100:8.1f}%" if gpu_rate else f"{'-':>9}"
+        flag = " ⚠️" if median and rate < 0.8 * median else ""
+        safe_print(f"   {str(label):<28} {batches:>8} {keys:>10.3g} {rate / 1e6:>9.1f} "
+                   f"{(gpu_rate or 0) / 1e6:>9.1f} {overhead}{flag}")
+
+def run_perf_report(hours=PERF_REPORT_HOURS):
+    """Keys/sec by host, by GPU and per hour over the last `hours` hours"""
+    since = datetime.now() - timedelta(hours=hours)
+    if SQLITE_DB:
+        since = since.strftime('%Y-%m-%d %H:%M:%S')
+        hour_sql = "strftime('%Y-%m-%d %H:00', start_tm)"
+        gpu_sql = "run_host || ' gpu ' || run_gpu"
+    else:
+        hour_sql = "FORMAT(start_tm, 'yyyy-MM-dd HH:00')"
+        gpu_sql = "CONCAT(run_host, ' gpu ', run_gpu)"
+    
+    safe_print("="*60)
+    safe_print(f"📈 Batch performance on {TABLE}, last {hours:g}h")
+    safe_print("="*60)
+    groups = [("By host:", "run_host"), ("By GPU:", gpu_sql), ("By hour:", hour_sql)]
+    for title, group_sql in groups:
+        rows = perf_rows(group_sql, since)
+        if not rows:
+            safe_print("   No performance records in this window")
+            return
+        show_perf_group(title, rows)
+    safe_print("\n   ⚠️ = below 80% of the median rate in its group")
 
 # =============================================
 # CALCULATION FUNCTIONS
@@ -477,6 +1488,20 @@ def parse_xiebo_log(gpu_id, target_address=None):
     except:
         return found_info
 
+# GPU kernel execution errors in ./log output
+GPU_ERROR_PATTERNS = [
+    r'no kernel image is available for execution on the device',
+    r'GPUEngine: Kernel:',
+    r'CUDA error',
+    r'GPU error',
+    r'unsupported GPU',
+    r'cannot launch kernel',
+    r'invalid device function',
+    r'incompatible GPU',
+    r'device not found',
+    r'failed to initialize',
+]
+
 def check_gpu_execution_errors(gpu_id):
     """Check log for GPU execution errors"""
     log_file = get_gpu_log_file(gpu_id)
@@ -487,21 +1512,7 @@ def check_gpu_execution_errors(gpu_id):
         with open(log_file, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        # Check for GPU kernel execution errors
-        error_patterns = [
-            r'no kernel image is available for execution on the device',
-            r'GPUEngine: Kernel:',
-            r'CUDA error',
-            r'GPU error',
-            r'unsupported GPU',
-            r'cannot launch kernel',
-            r'invalid device function',
-            r'incompatible GPU',
-            r'device not found',
-            r'failed to initialize',
-        ]
-        
-        for pattern in error_patterns:
+        for pattern in GPU_ERROR_PATTERNS:
             if re.search(pattern, content, re.IGNORECASE):
                 return True
         
@@ -509,11 +1520,455 @@ def check_gpu_execution_errors(gpu_id):
     except:
         return False
 
+# =============================================
+# HOST RESOURCE GOVERNOR
+# =============================================
+def parse_cpu_list(cpu_list):
+    """Parse a kernel cpulist such as '0-3,8,10-11' into a set"""
+    cpus = set()
+    for part in cpu_list.strip().split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-', 1)
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+def parse_affinity_spec(spec):
+    """Parse '0=0-7;1=8-15' into {gpu_id: cpu_set} (ValueError if malformed)"""
+    cpu_sets = {}
+    for entry in spec.split(';'):
+        if not entry.strip():
+            continue
+        gpu, sep, cpu_list = entry.partition('=')
+        try:
+            cpus = parse_cpu_list(cpu_list)
+            if not sep or not cpus or min(cpus) < 0:
+                raise ValueError
+            cpu_sets[int(gpu.strip())] = cpus
+        except ValueError:
+            raise ValueError(f"bad XIEBO_CPU_AFFINITY entry '{entry.strip()}'") from None
+    return cpu_sets
+
+def get_gpu_pci_bus_ids():
+    """Map GPU index -> sysfs PCI address using nvidia-smi"""
+    bus_ids = {}
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "--query-gpu=index,pci.bus_id", "--format=csv,noheader"],
+            capture_output=True, text=True, timeout=10
+        )
+        for line in result.stdout.splitlines():
+            index, bus_id = [x.strip() for x in line.split(',', 1)]
+            # nvidia-smi: 00000000:3B:00.0, sysfs: 0000:3b:00.0
+            domain, rest = bus_id.split(':', 1)
+            bus_ids[int(index)] = f"{domain[-4:]}:{rest}".lower()
+    except:
+        pass
+    return bus_ids
+
+def get_numa_local_cpu_sets(gpu_ids):
+    """Split each NUMA node's cores between the GPUs attached to it"""
+    bus_ids = get_gpu_pci_bus_ids()
+    allowed = os.sched_getaffinity(0)
+    by_node = {}
+    for gpu_id in gpu_ids:
+        if gpu_id not in bus_ids:
+            continue
+        try:
+            with open(f"/sys/bus/pci/devices/{bus_ids[gpu_id]}/local_cpulist", 'r') as f:
+                local_cpus = frozenset(parse_cpu_list(f.read()) & allowed)
+        except:
+            continue
+        if local_cpus:
+            by_node.setdefault(local_cpus, []).append(gpu_id)
+    
+    cpu_sets = {}
+    for local_cpus, node_gpus in by_node.items():
+        cores = sorted(local_cpus)
+        share = max(1, len(cores) // len(node_gpus))
+        for i, gpu_id in enumerate(sorted(node_gpus)):
+            chunk = cores[i * share:(i + 1) * share] or cores
+            cpu_sets[gpu_id] = set(chunk)
+    return cpu_sets
+
+def can_lower_nice():
+    """Children are restored to CHILD_NICE, which needs CAP_SYS_NICE or RLIMIT_NICE"""
+    try:
+        if os.geteuid() == 0:
+            return True
+        import resource
+        return resource.getrlimit(resource.RLIMIT_NICE)[0] >= 20 - CHILD_NICE
+    except:
+        return False
+
+def init_resource_governor(gpu_ids):
+    """Resolve GPU CPU sets and lower the wrapper's own priority"""
+    GPU_CPU_SETS.clear()
+    if hasattr(os, 'sched_setaffinity'):
+        if CPU_AFFINITY_SPEC == 'auto':
+            GPU_CPU_SETS.update(get_numa_local_cpu_sets(gpu_ids))
+        elif CPU_AFFINITY_SPEC:
+            try:
+                GPU_CPU_SETS.update(parse_affinity_spec(CPU_AFFINITY_SPEC))
+            except ValueError as e:
+                print(f"❌ {e}")
+                print("Usage: XIEBO_CPU_AFFINITY=auto or XIEBO_CPU_AFFINITY='GPU=CPUS;...' (e.g. '0=0-7;1=8-15')")
+                sys.exit(1)
+    for gpu_id, cpus in sorted(GPU_CPU_SETS.items()):
+        safe_print(f"[GPU {gpu_id}] 📌 CPU set: {','.join(str(c) for c in sorted(cpus))}")
+    
+    # Threads inherit the creating thread's nice value, so lowering the main
+    # thread here covers every monitor thread started afterwards.
+    if HOUSEKEEPING_NICE > CHILD_NICE and hasattr(os, 'setpriority'):
+        if can_lower_nice():
+            set_thread_priority(HOUSEKEEPING_NICE)
+        else:
+            safe_print("⚠️ Housekeeping nice skipped: children could not be restored without CAP_SYS_NICE")
+
+def extend_resource_governor(gpu_id):
+    """Resolve a CPU set for a GPU added at runtime"""
+    if gpu_id in GPU_CPU_SETS or not hasattr(os, 'sched_setaffinity'):
+        return
+    if CPU_AFFINITY_SPEC == 'auto':
+        GPU_CPU_SETS.update(get_numa_local_cpu_sets([gpu_id]))
+    elif CPU_AFFINITY_SPEC:
+        cpus = parse_affinity_spec(CPU_AFFINITY_SPEC).get(gpu_id)
+        if cpus:
+            GPU_CPU_SETS[gpu_id] = cpus
+
+def set_thread_priority(nice):
+    """Set the nice value of the calling thread only (Linux)"""
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), nice)
+    except:
+        pass
+
+def pin_current_thread(gpu_id):
+    """Pin the calling monitor thread to its GPU's CPU set"""
+    cpus = GPU_CPU_SETS.get(int(gpu_id))
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except:
+            pass
+
+def govern_child_process(pid, gpu_id):
+    """Apply the GPU's CPU set and CHILD_NICE to every thread of a child"""
+    cpus = GPU_CPU_SETS.get(int(gpu_id))
+    restore_nice = HOUSEKEEPING_NICE > CHILD_NICE and hasattr(os, 'setpriority') and can_lower_nice()
+    if not cpus and not restore_nice:
+        return
+    try:
+        tids = [int(t) for t in os.listdir(f"/proc/{pid}/task")]
+    except:
+        tids = [pid]
+    for tid in tids:
+        try:
+            if cpus:
+                os.sched_setaffinity(tid, cpus)
+            if restore_nice:
+                os.setpriority(os.PRIO_PROCESS, tid, CHILD_NICE)
+        except:
+            pass
+
+# =============================================
+# CLAIM ORDER
+# =============================================
+def default_host_index(host_count):
+    """Stable shard for this machine: hash of the hostname"""
+    digest = hashlib.sha1(platform.node().encode()).digest()
+    return int.from_bytes(digest[:4], 'big') % host_count
+
+class ClaimOrder:
+    """Maps claim tickets 0, 1, 2, ... to work for one host.
+    
+    The mapping is a pure function of the ticket, so forked workers sharing
+    one ticket counter still split the work. Tickets pass through three phases:
+    
+      own     one id per ticket from this host's slice, in policy order
+      window  one ticket per `window` ids of the rest of [first_id, last_id],
+              starting after this host's slice; the claimer lists the open
+              ids with a single ranged query instead of probing each id
+      sweep   past the last window, ranged queries for rows still open (ids
+              dropped by a worker that exited or skipped by a window claim,
+              'error' rows not retried since `started`), until none are left
+    
+    Own slice per policy:
+      sequential  all of [first_id, last_id], ascending
+      sharded     a contiguous slice per host
+      strided     every host_count-th id, offset by the host index
+      random      this host's share of the windows, shuffled inside each
+      priority    ids ordered by a priority column, strided across hosts
+    """
+    def __init__(self, policy, first_id, last_id, host_index=0, host_count=1, window=1024, priority_ids=None):
+        if policy not in CLAIM_POLICIES:
+            raise ValueError(f"Unknown claim policy '{policy}' (choose from {', '.join(CLAIM_POLICIES)})")
+        self.policy = policy
+        self.first_id = first_id
+        self.last_id = last_id
+        self.host_count = max(1, host_count)
+        self.host_index = host_index % self.host_count
+        self.priority_ids = priority_ids
+        self.span = max(0, last_id - first_id + 1)
+        # Never coarser than one host's share, or hosts would start on the same window
+        self.window = max(1, min(window, self.span // self.host_count))
+        self.windows = -(-self.span // self.window)
+        # Consecutive own tickets map to consecutive ids (lets callers skip runs)
+        self.contiguous = policy in ('sequential', 'sharded')
+        # DB time the run began; 'error' rows stamped before it still get a retry
+        self.started = None
+        
+        h, hosts = self.host_index, self.host_count
+        if policy == 'sequential':
+            self.own_lo, self.own_hi = 0, self.span
+            self.own_tickets = self.span
+        elif policy == 'sharded':
+            lane_len = -(-self.span // hosts)
+            self.own_lo = min(self.span, h * lane_len)
+            self.own_hi = min(self.span, self.own_lo + lane_len)
+            self.own_tickets = self.own_hi - self.own_lo
+        elif policy == 'random':
+            first_window, end_window = h * self.windows // hosts, (h + 1) * self.windows // hosts
+            self.own_lo = first_window * self.window
+            self.own_hi = min(self.span, end_window * self.window)
+            self.own_tickets = (end_window - first_window) * self.window
+            # Affine shuffle inside a window: offset -> (a * offset + c) % window
+            rng = random.Random(h)
+            self.mult = rng.randrange(1, self.window + 1) | 1
+            while math.gcd(self.mult, self.window) != 1:
+                self.mult += 2
+            self.shift = rng.randrange(self.window)
+        else:
+            # Interleaved: no contiguous slice, windows start at this host's share
+            count = len(priority_ids) if policy == 'priority' else self.span
+            self.own_tickets = -(-count // hosts)
+            self.own_lo = self.own_hi = h * self.span // hosts
+        self.first_window = self.own_hi // self.window
+    
+    def phase(self, ticket):
+        if ticket < self.own_tickets:
+            return 'own'
+        if ticket < self.own_tickets + self.windows:
+            return 'window'
+        return 'sweep'
+    
+    def batch_id(self, ticket):
+        """Batch id for an own-slice ticket, None for a gap"""
+        if self.contiguous:
+            offset = self.own_lo + ticket
+        elif self.policy == 'random':
+            offset = (self.own_lo + ticket // self.window * self.window
+                      + (self.mult * (ticket % self.window) + self.shift) % self.window)
+        else:
+            offset = self.host_index + ticket * self.host_count
+            if self.policy == 'priority':
+                return self.priority_ids[offset] if offset < len(self.priority_ids) else None
+        return self.first_id + offset if offset < self.span else None
+    
+    def window_range(self, ticket):
+        """(lo, hi) ids of a window ticket, None if the window lies inside the own slice"""
+        index = (self.first_window + ticket - self.own_tickets) % self.windows
+        lo = index * self.window
+        hi = min(self.span, lo + self.window) - 1
+        if self.own_lo <= lo and hi < self.own_hi:
+            return None
+        return self.first_id + lo, self.first_id + hi
+    
+    def describe(self):
+        return (f"{self.policy} | host {self.host_index + 1}/{self.host_count} | "
+                f"{self.own_tickets} own of {self.span} ids from {self.first_id} | windows of {self.window}")
+
+def init_claim_order(start_id):
+    """Build CLAIM_ORDER for --batch-db; tickets then count from 0"""
+    global CLAIM_ORDER
+    if CLAIM_POLICY == 'sequential' and CLAIM_HOST_COUNT <= 1:
+        return False
+    if not re.fullmatch(r'\w+', CLAIM_PRIORITY_COLUMN):
+        raise ValueError(f"Invalid XIEBO_PRIORITY_COLUMN '{CLAIM_PRIORITY_COLUMN}'")
+    host_index = int(CLAIM_HOST_INDEX) if CLAIM_HOST_INDEX else default_host_index(max(1, CLAIM_HOST_COUNT))
+    
+    _, last_id = BATCH_DB.id_bounds()
+    priority_ids = None
+    if CLAIM_POLICY == 'priority':
+        priority_ids = BATCH_DB.ids_by_priority(CLAIM_PRIORITY_COLUMN, start_id)
+    CLAIM_ORDER = ClaimOrder(CLAIM_POLICY, start_id, start_id - 1 if last_id is None else last_id,
+                             host_index, CLAIM_HOST_COUNT, CLAIM_WINDOW, priority_ids)
+    CLAIM_ORDER.started = BATCH_DB.db_now()
+    return True
+
+# =============================================
+# SHARED-MEMORY STATUS BOARD
+# =============================================
+BOARD_HEADER = struct.Struct('<II')           # stop flag, slot count
+BOARD_SEQ = struct.Struct('<Q')
+BOARD_BODY = struct.Struct('<iiiIqqddIII')
+BOARD_FIELDS = ('gpu', 'pid', 'child', 'phase', 'batch', 'batches_done', 'rate', 'heartbeat',
+                'drain_finished', 'drain_requeued', 'unflushed')
+BOARD_SLOT_SIZE = BOARD_SEQ.size + BOARD_BODY.size
+BOARD_PHASES = ('idle', 'claiming', 'db_wait', 'running', 'stopped', 'calibrating', 'quarantined')
+
+class StatusBoard:
+    """Fixed-layout shared-memory board with one slot per GPU worker.
+    
+    Each slot has exactly one writer. The writer makes the slot's sequence
+    number odd, writes the body, then makes it even again; readers retry
+    when they see an odd or changed sequence. Neither side takes a lock or
+    makes a syscall per update.
+    """
+    def __init__(self, gpu_ids):
+        from multiprocessing import shared_memory
+        self.slots = {gpu_id: i for i, gpu_id in enumerate(gpu_ids)}
+        size = BOARD_HEADER.size + BOARD_SLOT_SIZE * len(gpu_ids)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.buf = self.shm.buf
+        self.buf[:size] = bytes(size)
+        BOARD_HEADER.pack_into(self.buf, 0, 0, len(gpu_ids))
+    
+    def _offset(self, gpu_id):
+        return BOARD_HEADER.size + BOARD_SLOT_SIZE * self.slots[gpu_id]
+    
+    def publish(self, gpu_id, **fields):
+        """Update some fields of a GPU's slot (heartbeat is always refreshed)"""
+        off = self._offset(gpu_id)
+        seq = BOARD_SEQ.unpack_from(self.buf, off)[0]
+        values = dict(zip(BOARD_FIELDS, BOARD_BODY.unpack_from(self.buf, off + BOARD_SEQ.size)))
+        if 'phase' in fields:
+            fields['phase'] = BOARD_PHASES.index(fields['phase'])
+        values.update(fields)
+        values['heartbeat'] = time.time()
+        BOARD_SEQ.pack_into(self.buf, off, seq | 1)
+        BOARD_BODY.pack_into(self.buf, off + BOARD_SEQ.size, *(values[f] for f in BOARD_FIELDS))
+        BOARD_SEQ.pack_into(self.buf, off, (seq | 1) + 1)
+    
+    def read(self, gpu_id):
+        """Consistent snapshot of a GPU's slot"""
+        off = self._offset(gpu_id)
+        for _ in range(1000):
+            before = BOARD_SEQ.unpack_from(self.buf, off)[0]
+            body = BOARD_BODY.unpack_from(self.buf, off + BOARD_SEQ.size)
+            if not before & 1 and BOARD_SEQ.unpack_from(self.buf, off)[0] == before:
+                break
+        state = dict(zip(BOARD_FIELDS, body))
+        state['phase'] = BOARD_PHASES[state['phase']] if state['phase'] < len(BOARD_PHASES) else 'idle'
+        return state
+    
+    def request_stop(self):
+        BOARD_HEADER.pack_into(self.buf, 0, 1, len(self.slots))
+    
+    def stop_requested(self):
+        return BOARD_HEADER.unpack_from(self.buf, 0)[0] != 0
+    
+    def close(self, unlink=False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+def board_publish(gpu_id, **fields):
+    """Publish worker state when running under the process supervisor"""
+    if STATUS_BOARD is not None:
+        STATUS_BOARD.publish(int(gpu_id), **fields)
+
+def stop_requested():
+    """Local stop flag, a drain, or a stop raised by any sibling worker process"""
+    with STOP_SEARCH_FLAG_LOCK:
+        if STOP_SEARCH_FLAG:
+            return True
+    if DRAIN_REQUESTED.is_set():
+        return True
+    return STATUS_BOARD is not None and STATUS_BOARD.stop_requested()
+
+def next_ticket():
+    """Next value of the in-process counter or the shared one"""
+    global CURRENT_GLOBAL_BATCH_ID
+    if SHARED_BATCH_COUNTER is not None:
+        with SHARED_BATCH_COUNTER.get_lock():
+            ticket = SHARED_BATCH_COUNTER.value
+            SHARED_BATCH_COUNTER.value += 1
+        return ticket
+    with BATCH_ID_LOCK:
+        ticket = CURRENT_GLOBAL_BATCH_ID
+        CURRENT_GLOBAL_BATCH_ID += 1
+    return ticket
+
+def claim_steps(order, next_ticket, pop_returned, return_ids, single_window_id=False):
+    """The claim decision: returned ids first, then tickets through order.
+    
+    Shared by claim_batch_id and simulate.py, so it does no I/O itself: it
+    yields range queries as (lo, hi, limit, retried_since) and is sent the
+    open ids, or None once stopping. Its return value is the batch id or
+    WorkerControl.END_OF_WORK. single_window_id takes one id per window
+    instead of handing the rest back through return_ids.
+    """
+    batch_id = pop_returned()
+    if batch_id is not None:
+        return batch_id
+    if order is None:
+        return next_ticket()
+    while True:
+        ticket = next_ticket()
+        phase = order.phase(ticket)
+        if phase == 'own':
+            batch_id = order.batch_id(ticket)
+            if batch_id is not None:
+                return batch_id
+            continue
+        
+        if phase == 'window':
+            bounds = order.window_range(ticket)
+            if bounds is None:
+                continue
+            ids = yield (bounds[0], bounds[1], 1 if single_window_id else order.window, None)
+        else:
+            ids = yield (order.first_id, order.last_id, order.window, order.started)
+            # One id per sweep query, spread by ticket so workers do not collide
+            ids = ids and [ids[ticket % len(ids)]]
+        if ids is None or (phase == 'sweep' and not ids):
+            return WorkerControl.END_OF_WORK
+        if ids:
+            return_ids(ids[1:])
+            return ids[0]
+
+def claim_batch_id():
+    """Next batch id: returned ids first, then the counter through CLAIM_ORDER.
+    May return WorkerControl.END_OF_WORK once a claim order is exhausted."""
+    # Handed-back ids are process-local: a worker process would take them with
+    # it when it exits, and would hoard the window meanwhile. It takes the
+    # first id of a window; the rest is left to the sweep.
+    steps = claim_steps(CLAIM_ORDER, next_ticket, pop_returned_batch_id, return_batch_ids,
+                        single_window_id=WORKER_MODE == 'process')
+    try:
+        query = next(steps)
+        while True:
+            query = steps.send(wait_for_open_ids(*query))
+    except StopIteration as done:
+        return done.value
+    except PermanentDBError as e:
+        safe_print(f"❌ Claim query failed: {e}")
+        return WorkerControl.END_OF_WORK
+
+def pop_returned_batch_id():
+    """Lowest handed-back id, or None"""
+    with BATCH_ID_LOCK:
+        return RETURNED_BATCH_IDS.pop(0) if RETURNED_BATCH_IDS else None
+
+def return_batch_ids(batch_ids):
+    """Give claimed-but-unrun ids back so the next claim picks them up"""
+    with BATCH_ID_LOCK:
+        RETURNED_BATCH_IDS.extend(batch_ids)
+        RETURNED_BATCH_IDS.sort()
+
 # =============================================
 # PROCESS MONITORING
 # =============================================
-def monitor_xiebo_process(process, gpu_id, batch_id, range_info, is_special_address=False):
-    """Monitor xiebo process output"""
+RATE_PATTERN = re.compile(r'([\d.]+)\s*MK/s', re.IGNORECASE)
+
+def monitor_xiebo_process(process, gpu_id, batch_id, range_info, is_special_address=False, rates=None):
+    """Monitor xiebo process output (reported MK/s values are appended to rates)"""
     global LAST_LOG_UPDATE_TIME
     if gpu_id not in LAST_LOG_UPDATE_TIME:
         LAST_LOG_UPDATE_TIME[gpu_id] = datetime.now()
@@ -525,7 +1980,14 @@ def monitor_xiebo_process(process, gpu_id, batch_id, range_info, is_special_addr
         if output_line:
             stripped = output_line.strip()
             if stripped:
-                log_xiebo_output(gpu_id, stripped)
+                log_xiebo_output(gpu_id, stripped, batch_id)
+                rate_match = RATE_PATTERN.search(stripped)
+                if rate_match:
+                    board_publish(gpu_id, rate=float(rate_match.group(1)))
+                    if rates is not None:
+                        rates.append(float(rate_match.group(1)))
+                else:
+                    board_publish(gpu_id)
                 curr = datetime.now()
                 if (curr - LAST_LOG_UPDATE_TIME[gpu_id]).total_seconds() >= LOG_UPDATE_INTERVAL:
                     show_log_preview(gpu_id, range_info, is_special_address)
@@ -533,6 +1995,22 @@ def monitor_xiebo_process(process, gpu_id, batch_id, range_info, is_special_addr
     
     return process.poll()
 
+def batch_perf(gpu_id, range_bits, run_seconds, rates, completed):
+    """Performance fields for one finished batch (see PERF_COLUMNS)"""
+    gpu_rate = sum(rates) / len(rates) * 1e6 if rates else None
+    keys = 1 << range_bits
+    if not completed:
+        # Partial run: estimate coverage from the reported rate
+        keys = min(keys, int(gpu_rate * run_seconds)) if gpu_rate else 0
+    return {
+        'run_host': platform.node()[:64],
+        'run_gpu': int(gpu_id),
+        'run_seconds': round(run_seconds, 3),
+        'keys_scanned': keys,
+        'keys_per_sec': keys / run_seconds if run_seconds > 0 else None,
+        'gpu_keys_per_sec': gpu_rate,
+    }
+
 # =============================================
 # MAIN XIEBO RUNNER
 # =============================================
@@ -540,9 +2018,13 @@ def run_xiebo(gpu_id, start_hex, range_bits, address, batch_id=None):
     """Run xiebo binary with proper error handling"""
     global STOP_SEARCH_FLAG
     
-    cmd = ["./log", "-gpuId", str(gpu_id), "-start", start_hex, "-range", str(range_bits), address]
+    cmd = [XIEBO_BINARY, "-gpuId", str(gpu_id), "-start", start_hex, "-range", str(range_bits), address]
     is_special_address = (address == SPECIAL_ADDRESS_NO_OUTPUT)
     
+    # Claimed batches stay untouched if the binary never became available
+    if not wait_for_binary():
+        return 1, {'found': False}
+    
     try:
         start_int = int(start_hex, 16)
         end_hex = hex(start_int + (1 << range_bits))[2:].upper()
@@ -554,18 +2036,26 @@ def run_xiebo(gpu_id, start_hex, range_bits, address, batch_id=None):
         if batch_id is not None:
             update_batch_status(batch_id, 'inprogress', 'No', '', True)
         
-        log_xiebo_output(gpu_id, f"START BATCH {batch_id} | CMD: {' '.join(cmd)}")
+        log_xiebo_output(gpu_id, f"START BATCH {batch_id} | CMD: {' '.join(cmd)}", batch_id, 'start')
         
         # Try to execute the binary
         try:
             process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+            govern_child_process(process.pid, gpu_id)
+            board_publish(gpu_id, phase='running', batch=batch_id if batch_id is not None else -1, child=process.pid)
         except Exception as e:
             safe_print(f"[GPU {gpu_id}] ❌ Failed to execute xiebo binary: {e}")
             if batch_id is not None:
                 update_batch_status(batch_id, 'error', 'No', '', True)
             return 1, {'found': False}
         
-        exit_code = monitor_xiebo_process(process, gpu_id, batch_id, range_info_str, is_special_address)
+        ACTIVE_CHILDREN[gpu_id] = process
+        rates = []
+        run_started = time.time()
+        exit_code = monitor_xiebo_process(process, gpu_id, batch_id, range_info_str, is_special_address, rates)
+        run_seconds = time.time() - run_started
+        ACTIVE_CHILDREN.pop(gpu_id, None)
+        board_publish(gpu_id, child=0)
         
         # Check for GPU execution errors in log
         has_gpu_error = check_gpu_execution_errors(gpu_id)
@@ -579,7 +2069,13 @@ def run_xiebo(gpu_id, start_hex, range_bits, address, batch_id=None):
             wif_val = found_info['wif_key'] if found_info['found'] else ''
             
             # Determine final status based on execution result and GPU errors
-            if exit_code == 0 and not has_gpu_error:
+            if batch_id in DRAIN_REQUEUED and not found_info['found']:
+                # Aborted at the drain deadline - hand the batch back untouched
+                final_status = DRAIN_REQUEUED.pop(batch_id)
+                found_status, wif_val = 'No', ''
+                DRAIN_STATS['requeued'] += 1
+                board_publish(gpu_id, drain_requeued=DRAIN_STATS['requeued'])
+            elif exit_code == 0 and not has_gpu_error:
                 # Process completed successfully without GPU errors - mark as done
                 final_status = 'done'
             else:
@@ -597,11 +2093,21 @@ def run_xiebo(gpu_id, start_hex, range_bits, address, batch_id=None):
                 else:
                     safe_print(f"[GPU {gpu_id}] ❌ Process failed with exit code {exit_code} for batch {batch_id}")
             
-            db_success = update_batch_status(batch_id, final_status, found_status, wif_val, True)
+            perf = None
+            if final_status in ('done', 'error'):
+                perf = batch_perf(gpu_id, range_bits, run_seconds, rates, final_status == 'done')
+            log_structured(gpu_id, batch_id, 'finish', status=final_status, exit_code=exit_code,
+                           found=found_status == 'Yes', gpu_error=has_gpu_error,
+                           seconds=round(run_seconds, 3), keys=perf['keys_scanned'] if perf else None)
+            db_success = update_batch_status(batch_id, final_status, found_status, wif_val, True, perf)
             
             if not db_success:
                 time.sleep(2)
-                update_batch_status(batch_id, final_status, found_status, wif_val, True)
+                if not update_batch_status(batch_id, final_status, found_status, wif_val, True, perf):
+                    queue_status_write(batch_id, final_status, found_status, wif_val, perf)
+            if DRAIN_REQUESTED.is_set() and final_status == 'done':
+                DRAIN_STATS['finished'] += 1
+                board_publish(gpu_id, drain_finished=DRAIN_STATS['finished'])
             
             # Display results
             if found_info['found']:
@@ -624,43 +2130,680 @@ def run_xiebo(gpu_id, start_hex, range_bits, address, batch_id=None):
             update_batch_status(batch_id, 'error', 'No', '', True)
         return 1, {'found': False}
 
+# =============================================
+# GPU CALIBRATION
+# =============================================
+def suggested_range_bits(rate, target_seconds=TARGET_BATCH_SECONDS):
+    """Largest range bits a GPU at `rate` keys/s finishes within target_seconds"""
+    if not rate or rate * target_seconds < 2:
+        return None
+    return int(math.log2(rate * target_seconds))
+
+def calibrate_gpu(gpu_id):
+    """Run the binary on a tiny random range; returns ok, rate (keys/s) and reason.
+    
+    Output stays in memory: nothing reaches the GPU log that parse_xiebo_log
+    and check_gpu_execution_errors read for real batches.
+    """
+    result = {'ok': False, 'rate': None, 'reason': '', 'at': time.time()}
+    if not wait_for_binary():
+        result['reason'] = 'binary unavailable'
+        return result
+    
+    start_hex = f"{random.getrandbits(63) | (1 << 63):016X}"
+    cmd = [XIEBO_BINARY, "-gpuId", str(gpu_id), "-start", start_hex, "-range", str(CALIBRATION_BITS),
+           SPECIAL_ADDRESS_NO_OUTPUT]
+    metric_inc('calibration_runs_total')
+    t0 = time.time()
+    process = None
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        govern_child_process(process.pid, gpu_id)
+        # Registered like a batch child: 'remove now', the drain deadline and the
+        # supervisor's crash cleanup can all reach it
+        ACTIVE_CHILDREN[gpu_id] = process
+        board_publish(gpu_id, batch=-1, child=process.pid)
+        output, _ = process.communicate(timeout=CALIBRATION_TIMEOUT)
+        elapsed = time.time() - t0
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        result['reason'] = f"no result after {CALIBRATION_TIMEOUT:.0f}s"
+    except Exception as e:
+        result['reason'] = f"failed to execute: {e}"
+    else:
+        rates = [float(r) * 1e6 for r in RATE_PATTERN.findall(output)]
+        if rates:
+            result['rate'] = sum(rates) / len(rates)
+        elif process.returncode == 0 and elapsed > 0:
+            result['rate'] = (1 << CALIBRATION_BITS) / elapsed
+        
+        if process.returncode != 0:
+            result['reason'] = f"exit code {process.returncode}"
+        elif any(re.search(p, output, re.IGNORECASE) for p in GPU_ERROR_PATTERNS):
+            result['reason'] = "GPU execution error"
+        elif CALIBRATION_MIN_MKEYS and (result['rate'] or 0) < CALIBRATION_MIN_MKEYS * 1e6:
+            result['reason'] = f"below {CALIBRATION_MIN_MKEYS:g} MK/s"
+        else:
+            result['ok'] = True
+    finally:
+        if process is not None:
+            ACTIVE_CHILDREN.pop(gpu_id, None)
+            board_publish(gpu_id, child=0)
+    
+    if not result['ok']:
+        metric_inc('calibration_failures_total')
+    log_structured(gpu_id, None, 'calibration', result['reason'], ok=result['ok'], rate=result['rate'],
+                   range_bits=CALIBRATION_BITS, seconds=round(time.time() - t0, 3))
+    return result
+
+def show_calibration(gpu_id, result):
+    rate = f"{result['rate'] / 1e6:.1f} MK/s" if result['rate'] else "no rate"
+    if result['ok']:
+        bits = suggested_range_bits(result['rate'])
+        sizing = f" | ~{TARGET_BATCH_SECONDS:g}s batches at range {bits}" if bits else ""
+        safe_print(f"[GPU {gpu_id}] 🎯 Calibrated: {rate}{sizing}")
+    else:
+        safe_print(f"[GPU {gpu_id}] 🚫 Calibration failed ({result['reason']}, {rate})")
+
+def calibration_gate(gpu_id, control):
+    """Run due calibrations before claiming; False once the worker should exit.
+    
+    A GPU that fails stays out of the claim loop (its prefetched ids are
+    handed back) and is retested every CALIBRATION_RETRY seconds.
+    """
+    while True:
+        last = GPU_CALIBRATION.get(gpu_id)
+        now = time.time()
+        if last and last['ok'] and (CALIBRATION_INTERVAL <= 0 or now - last['at'] < CALIBRATION_INTERVAL):
+            return True
+        if last and not last['ok']:
+            if CALIBRATION_RETRY <= 0:
+                return False
+            if now < last['at'] + CALIBRATION_RETRY:
+                if stop_requested() or control.stopping.is_set():
+                    return False
+                time.sleep(min(1.0, last['at'] + CALIBRATION_RETRY - now))
+                continue
+        
+        control.release_prefetched()
+        board_publish(gpu_id, phase='calibrating')
+        result = calibrate_gpu(gpu_id)
+        GPU_CALIBRATION[gpu_id] = result
+        control.quarantined = not result['ok']
+        show_calibration(gpu_id, result)
+        board_publish(gpu_id, phase='idle' if result['ok'] else 'quarantined', rate=(result['rate'] or 0) / 1e6)
+
+def run_calibration(gpu_ids):
+    """--calibrate: measure each GPU once and suggest a batch size"""
+    safe_print(f"🎯 Calibrating GPUs {gpu_ids} on 2^{CALIBRATION_BITS}-key throwaway ranges")
+    failed = 0
+    for gpu_id in gpu_ids:
+        result = calibrate_gpu(gpu_id)
+        show_calibration(gpu_id, result)
+        failed += not result['ok']
+    return failed
+
 # =============================================
 # GPU WORKER
 # =============================================
-def gpu_worker(gpu_id, address):
-    """GPU worker thread"""
-    global CURRENT_GLOBAL_BATCH_ID, STOP_SEARCH_FLAG
+def should_run_batch(batch, resumed=False):
+    """Skip batches that are done or being run elsewhere"""
+    status = str(batch.get('status') or '0').strip()
+    return not (status == 'done' or (status == 'inprogress' and not resumed))
+
+class WorkerControl:
+    """Runtime switches for one GPU worker, driven by the control socket"""
+    END_OF_WORK = object()
+    
+    def __init__(self, gpu_id):
+        self.gpu_id = gpu_id
+        self.stopping = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+        self.prefetched = []
+        self.prefetch_lock = threading.Lock()
+        self.current_batch = None
+        self.current_batch_status = None
+        self.quarantined = False
+        self.thread = None
+    
+    def wait_until_runnable(self):
+        """Block while paused; False once the worker should exit"""
+        while not self.running.wait(1.0):
+            # A paused GPU must not sit on claimed ids (a late prefetch included)
+            self.release_prefetched()
+            if self.stopping.is_set() or stop_requested():
+                return False
+        return not self.stopping.is_set()
+    
+    def next_batch_id(self):
+        with self.prefetch_lock:
+            if self.prefetched:
+                return self.prefetched.pop(0)
+        return claim_batch_id()
+    
+    def release_prefetched(self):
+        with self.prefetch_lock:
+            ids = [b for b in self.prefetched if b is not self.END_OF_WORK]
+            self.prefetched = []
+        if ids:
+            return_batch_ids(ids)
+    
+    def state(self):
+        if self.stopping.is_set():
+            return 'stopping'
+        if self.quarantined:
+            return 'quarantined'
+        return 'running' if self.running.is_set() else 'paused'
+
+def prefetch_batches(control):
+    """Look ahead while the GPU is busy: claim ids and skip finished rows so
+    the next runnable id is ready. Candidates are re-read before they run."""
+    while control.running.is_set() and not control.stopping.is_set() and not stop_requested():
+        with control.prefetch_lock:
+            if len(control.prefetched) >= PREFETCH_DEPTH or WorkerControl.END_OF_WORK in control.prefetched:
+                return
+        batch_id = claim_batch_id()
+        if batch_id is WorkerControl.END_OF_WORK:
+            batch = None
+        else:
+            try:
+                batch = get_batch_by_id(batch_id)
+            except (TransientDBError, PermanentDBError):
+                batch = {}   # unknown: let the worker fetch it the normal way
+            if batch is None and CLAIM_ORDER is not None:
+                continue     # a hole in the id space; the order ends with END_OF_WORK
+        if batch and not should_run_batch(batch):
+            metric_inc('prefetch_skipped_total')
+            continue
+        with control.prefetch_lock:
+            control.prefetched.append(WorkerControl.END_OF_WORK if batch is None else batch_id)
+
+def gpu_worker(gpu_id, address, first_batch_id=None, control=None):
+    """GPU worker thread (or process body in process mode).
+    
+    first_batch_id re-runs a batch left 'inprogress' by a crashed worker.
+    control carries pause/stop requests and the prefetched ids.
+    """
     is_special_address = (address == SPECIAL_ADDRESS_NO_OUTPUT)
+    control = control or WorkerControl(gpu_id)
+    pin_current_thread(gpu_id)
+    batches_done = 0
     
+    try:
+        while True:
+            if stop_requested() or not control.wait_until_runnable():
+                break
+            # A resumed batch is already 'inprogress' under this GPU; calibrate after it
+            if CALIBRATE and first_batch_id is None and not calibration_gate(gpu_id, control):
+                break
+            
+            resumed = first_batch_id is not None
+            if resumed:
+                batch_id, first_batch_id = first_batch_id, None
+            else:
+                batch_id = control.next_batch_id()
+            if batch_id is WorkerControl.END_OF_WORK:
+                break
+            board_publish(gpu_id, phase='claiming', batch=batch_id)
+            
+            try:
+                batch = wait_for_batch(gpu_id, batch_id)
+            except PermanentDBError as e:
+                safe_print(f"[GPU {gpu_id}] ❌ Error getting batch {batch_id}: {e}")
+                break
+            if not batch:
+                if CLAIM_ORDER is not None:
+                    continue   # a hole in the id space; the order ends with END_OF_WORK
+                break
+            
+            if not should_run_batch(batch, resumed):
+                continue
+            
+            start_range = batch['start_range']
+            range_bits = calculate_range_bits(start_range, batch['end_range'])
+            
+            prefetcher = None
+            if PREFETCH_DEPTH > 0:
+                prefetcher = threading.Thread(target=prefetch_batches, args=(control,), daemon=True)
+                prefetcher.start()
+            control.current_batch = batch_id
+            control.current_batch_status = batch.get('status')
+            run_xiebo(gpu_id, start_range, range_bits, address, batch_id)
+            control.current_batch = None
+            if prefetcher:
+                prefetcher.join()
+            batches_done += 1
+            board_publish(gpu_id, phase='idle', batches_done=batches_done)
+            time.sleep(0.5)
+    finally:
+        control.release_prefetched()
+
+# =============================================
+# GRACEFUL DRAIN
+# =============================================
+def queue_status_write(batch_id, status, found, wif, perf=None):
+    """Keep a final status that could not be written, for a later flush"""
+    with PENDING_STATUS_LOCK:
+        PENDING_STATUS_WRITES.append((batch_id, status, found, wif, perf))
+    metric_inc('status_writes_queued_total')
+
+def flush_pending_status_writes(deadline=None):
+    """Retry queued status writes until empty or the deadline; returns how many remain"""
     while True:
-        with STOP_SEARCH_FLAG_LOCK:
-            if STOP_SEARCH_FLAG:
+        with PENDING_STATUS_LOCK:
+            pending = list(PENDING_STATUS_WRITES)
+            PENDING_STATUS_WRITES.clear()
+        failed = [w for w in pending if not update_batch_status(*w[:4], silent_mode=True, perf=w[4])]
+        with PENDING_STATUS_LOCK:
+            PENDING_STATUS_WRITES.extend(failed)
+            remaining = len(PENDING_STATUS_WRITES)
+        if not remaining or deadline is None or time.time() >= deadline:
+            return remaining
+        time.sleep(min(5, max(0, deadline - time.time())))
+
+def request_drain(deadline_seconds=None):
+    """Stop claiming, let running children finish, abort them after the deadline.
+    
+    Not for signal handlers: it prints and starts a thread. The SIGUSR1
+    handler only sets DRAIN_REQUESTED and the main loops call this.
+    """
+    global DRAIN_STARTED_AT
+    with DRAIN_LOCK:
+        if DRAIN_STARTED_AT:
+            return
+        DRAIN_STARTED_AT = time.time()
+        DRAIN_REQUESTED.set()
+    deadline_seconds = DRAIN_DEADLINE if deadline_seconds is None else deadline_seconds
+    safe_print(f"\n🚰 Drain requested: no new batches"
+               + (f", aborting leftovers in {deadline_seconds:.0f}s" if deadline_seconds > 0 else ""))
+    if deadline_seconds > 0:
+        threading.Thread(target=drain_watchdog, args=(DRAIN_STARTED_AT + deadline_seconds,), daemon=True).start()
+
+def drain_watchdog(deadline):
+    """At the deadline, checkpoint and requeue every batch still running.
+    Children without a batch (calibration runs) are just stopped."""
+    time.sleep(max(0, deadline - time.time()))
+    for gpu_id, process in list(ACTIVE_CHILDREN.items()):
+        control = WORKERS.get(gpu_id)
+        batch_id = control.current_batch if control else None
+        if batch_id is None and STATUS_BOARD is not None:
+            batch_id = STATUS_BOARD.read(int(gpu_id))['batch']
+        if batch_id is not None and batch_id >= 0:
+            status = control.current_batch_status if control else None
+            # A batch resumed after a crash was read as 'inprogress'; writing that
+            # back would hide it from should_run_batch and open_ids for good
+            DRAIN_REQUEUED[batch_id] = None if status == 'inprogress' else status
+            log_structured(gpu_id, batch_id, 'checkpoint', elapsed=round(time.time() - DRAIN_STARTED_AT, 1),
+                           reason='drain deadline')
+            safe_print(f"[GPU {gpu_id}] ⏱️ Drain deadline: requeueing batch {batch_id}")
+        else:
+            safe_print(f"[GPU {gpu_id}] ⏱️ Drain deadline: stopping calibration run")
+        try:
+            process.terminate()
+        except OSError:
+            pass
+
+def install_drain_handler():
+    """SIGUSR1 starts a drain (no-op where the signal does not exist).
+    
+    The handler runs on the main thread, which may hold PRINT_LOCK or other
+    locks, so it only sets the event; see poll_drain.
+    """
+    import signal
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: DRAIN_REQUESTED.set())
+
+def poll_drain():
+    """Finish a signal-requested drain from a normal loop (message, watchdog)"""
+    if DRAIN_REQUESTED.is_set() and not DRAIN_STARTED_AT:
+        request_drain()
+
+def watch_for_drain():
+    """Worker processes: their main thread is the worker, so poll from a side thread"""
+    while not DRAIN_REQUESTED.wait(1.0):
+        pass
+    poll_drain()
+
+def show_drain_summary(board=None, gpu_ids=()):
+    """Flush and report; under the supervisor, sum what the workers published"""
+    poll_drain()
+    if board is not None:
+        states = [board.read(gpu_id) for gpu_id in gpu_ids]
+        finished = sum(state['drain_finished'] for state in states)
+        requeued = sum(state['drain_requeued'] for state in states)
+        remaining = sum(state['unflushed'] for state in states)
+    else:
+        remaining = flush_pending_status_writes(time.time() + 60)
+        finished, requeued = DRAIN_STATS['finished'], DRAIN_STATS['requeued']
+    safe_print("\n" + "="*60)
+    safe_print(f"🚰 Drain complete in {time.time() - DRAIN_STARTED_AT:.0f}s")
+    safe_print(f"   Batches finished during drain: {finished}")
+    safe_print(f"   Batches requeued at deadline:  {requeued}")
+    safe_print(f"   Status writes left unflushed:  {remaining}")
+    safe_print("="*60)
+
+# =============================================
+# MULTI-PROCESS SUPERVISOR
+# =============================================
+def process_worker_main(gpu_id, address, board, counter, first_batch_id=None):
+    """Entry point of a forked per-GPU worker process"""
+    global STATUS_BOARD, SHARED_BATCH_COUNTER, METRICS_FILE
+    STATUS_BOARD = board
+    SHARED_BATCH_COUNTER = counter
+    METRICS.clear()
+    METRICS_FILE = os.path.join(LOG_DIR, f"metrics_gpu_{gpu_id}.prom")
+    board_publish(gpu_id, gpu=gpu_id, pid=os.getpid(), child=0, phase='idle', rate=0.0)
+    
+    def metrics_loop():
+        while True:
+            time.sleep(10)
+            write_metrics_file()
+    threading.Thread(target=metrics_loop, daemon=True).start()
+    threading.Thread(target=watch_for_drain, daemon=True).start()
+    
+    control = WorkerControl(gpu_id)
+    WORKERS[gpu_id] = control
+    gpu_worker(gpu_id, address, first_batch_id, control)
+    if DRAIN_REQUESTED.is_set():
+        board_publish(gpu_id, unflushed=flush_pending_status_writes(time.time() + 60))
+    
+    with STOP_SEARCH_FLAG_LOCK:
+        if STOP_SEARCH_FLAG:
+            board.request_stop()
+    board_publish(gpu_id, phase='stopped', child=0)
+    write_metrics_file()
+
+def kill_pid_signal(pid, signal_name):
+    import signal
+    try:
+        os.kill(pid, getattr(signal, signal_name))
+    except (OSError, AttributeError):
+        pass
+
+def kill_pid(pid):
+    """Terminate a leftover ./log child of a dead or stopped worker"""
+    if pid > 0:
+        try:
+            os.kill(pid, 15)
+        except OSError:
+            pass
+
+def show_board_summary(board, gpu_ids):
+    now = time.time()
+    for gpu_id in gpu_ids:
+        state = board.read(gpu_id)
+        safe_print(f"\033[96m[GPU {gpu_id}]\033[0m {state['phase']:<8} batch {state['batch']} | "
+                   f"{state['rate']:.2f} MK/s | done {state['batches_done']} | "
+                   f"heartbeat {now - state['heartbeat']:.0f}s ago")
+
+def run_process_supervisor(gpu_ids, start_id, address):
+    """Run one process per GPU and restart any that crash or hang"""
+    import multiprocessing
+    ctx = multiprocessing.get_context('fork')
+    board = StatusBoard(gpu_ids)
+    counter = ctx.Value('q', start_id)
+    workers = {}
+    pending_restarts = {}
+    restart_counts = {gpu_id: 0 for gpu_id in gpu_ids}
+    
+    def spawn(gpu_id, first_batch_id=None):
+        p = ctx.Process(target=process_worker_main, name=f"xiebo-gpu-{gpu_id}",
+                        args=(gpu_id, address, board, counter, first_batch_id), daemon=True)
+        p.start()
+        workers[gpu_id] = p
+    
+    for gpu_id in gpu_ids:
+        spawn(gpu_id)
+    last_summary = time.time()
+    drain_forwarded = False
+    
+    try:
+        while workers or pending_restarts:
+            if board.stop_requested():
+                safe_print("\n🛑 Stop Flag detected. Closing workers...")
                 break
-        
-        with BATCH_ID_LOCK:
-            batch_id = CURRENT_GLOBAL_BATCH_ID
-            CURRENT_GLOBAL_BATCH_ID += 1
-        
-        batch = get_batch_by_id(batch_id)
-        if not batch:
-            break
-        
-        status = str(batch.get('status') or '0').strip()
-        if status in ['done', 'inprogress']:
-            continue
-        
-        start_range = batch['start_range']
-        range_bits = calculate_range_bits(start_range, batch['end_range'])
-        
-        run_xiebo(gpu_id, start_range, range_bits, address, batch_id)
-        time.sleep(0.5)
+            now = time.time()
+            poll_drain()
+            if DRAIN_REQUESTED.is_set() and not drain_forwarded:
+                # Each worker runs its own drain (and deadline) on SIGUSR1
+                drain_forwarded = True
+                pending_restarts.clear()
+                for p in workers.values():
+                    kill_pid_signal(p.pid, 'SIGUSR1')
+            
+            for gpu_id, p in list(workers.items()):
+                state = board.read(gpu_id)
+                if p.is_alive():
+                    if state['phase'] == 'running' and now - state['heartbeat'] > WORKER_HEARTBEAT_TIMEOUT:
+                        safe_print(f"[GPU {gpu_id}] ⚠️ No heartbeat for {now - state['heartbeat']:.0f}s, killing worker")
+                        metric_inc(f'worker_hung_total{{gpu="{gpu_id}"}}')
+                        p.kill()
+                        p.join(5)
+                    continue
+                del workers[gpu_id]
+                if p.exitcode == 0 or DRAIN_REQUESTED.is_set():
+                    continue
+                
+                kill_pid(state['child'])
+                if state['batches_done'] > 0:
+                    restart_counts[gpu_id] = 0
+                delay = min(WORKER_MAX_RESTART_DELAY, 2 ** restart_counts[gpu_id])
+                restart_counts[gpu_id] += 1
+                resume_batch = state['batch'] if state['phase'] == 'running' else None
+                pending_restarts[gpu_id] = (now + delay, resume_batch)
+                metric_inc(f'worker_restarts_total{{gpu="{gpu_id}"}}')
+                safe_print(f"[GPU {gpu_id}] 💥 Worker exited with code {p.exitcode}, restarting in {delay}s"
+                           + (f" (re-running batch {resume_batch})" if resume_batch is not None else ""))
+            
+            for gpu_id, (when, resume_batch) in list(pending_restarts.items()):
+                if now >= when:
+                    del pending_restarts[gpu_id]
+                    spawn(gpu_id, resume_batch)
+            
+            if now - last_summary >= LOG_UPDATE_INTERVAL:
+                show_board_summary(board, gpu_ids)
+                last_summary = now
+            write_metrics_file()
+            time.sleep(2)
+    except KeyboardInterrupt:
+        safe_print("\n⚠️ User Interrupted.")
+    finally:
+        for gpu_id, p in workers.items():
+            kill_pid(board.read(gpu_id)['child'])
+            p.terminate()
+        for p in workers.values():
+            p.join(5)
+        write_metrics_file()
+        if DRAIN_REQUESTED.is_set():
+            show_drain_summary(board, gpu_ids)
+        board.close(unlink=True)
+
+def start_gpu_worker(gpu_id, address):
+    """Start a worker thread for a GPU; False if one is already registered"""
+    with WORKERS_LOCK:
+        if gpu_id in WORKERS:
+            return False
+        control = WorkerControl(gpu_id)
+        control.thread = threading.Thread(target=gpu_worker, args=(gpu_id, address, None, control), daemon=True)
+        WORKERS[gpu_id] = control
+    control.thread.start()
+    return True
+
+def run_thread_workers(gpu_ids, address):
+    """Run one gpu_worker thread per GPU until all finish or a stop"""
+    for gpu in gpu_ids:
+        start_gpu_worker(gpu, address)
+    control_server = start_control_server(address)
+    
+    try:
+        while True:
+            poll_drain()
+            with WORKERS_LOCK:
+                for gpu_id, control in list(WORKERS.items()):
+                    if not control.thread.is_alive():
+                        del WORKERS[gpu_id]
+                if not WORKERS:
+                    break
+            with STOP_SEARCH_FLAG_LOCK:
+                if STOP_SEARCH_FLAG:
+                    safe_print("\n🛑 Stop Flag detected. Closing workers...")
+                    break
+            if PENDING_STATUS_WRITES:
+                flush_pending_status_writes()
+            write_metrics_file()
+            time.sleep(2)
+    except KeyboardInterrupt:
+        safe_print("\n⚠️ User Interrupted.")
+    if DRAIN_REQUESTED.is_set():
+        show_drain_summary()
+    if control_server:
+        control_server.close()
+        try:
+            os.unlink(CONTROL_SOCKET)
+        except OSError:
+            pass
+    write_metrics_file()
+
+# =============================================
+# CONTROL SOCKET
+# =============================================
+CONTROL_HELP = """Commands:
+  status                     list workers
+  add GPU[,GPU...]           start workers for more GPUs
+  remove GPU[,GPU...] [now]  stop after the current batch ('now' aborts it, batch -> error)
+  pause GPU[,GPU...]|all     stop claiming after the current batch
+  resume GPU[,GPU...]|all    start claiming again
+  prefetch N                 look N runnable batches ahead per worker
+  drain [SECONDS]            finish running batches and exit (requeue leftovers after SECONDS)
+"""
+
+def parse_gpu_targets(arg):
+    with WORKERS_LOCK:
+        if arg == 'all':
+            return sorted(WORKERS)
+    return [int(x.strip()) for x in arg.split(',') if x.strip()]
+
+def handle_control_command(line, address):
+    """Apply one control command and return the reply text"""
+    global PREFETCH_DEPTH
+    parts = line.split()
+    if not parts:
+        return ""
+    cmd, args = parts[0].lower(), parts[1:]
+    
+    if cmd == 'status':
+        with WORKERS_LOCK:
+            controls = sorted(WORKERS.items())
+        rows = [f"prefetch depth: {PREFETCH_DEPTH}"]
+        for gpu_id, control in controls:
+            rows.append(f"GPU {gpu_id}: {control.state()} | batch {control.current_batch} | "
+                        f"prefetched {len(control.prefetched)}")
+        return "\n".join(rows)
+    if cmd == 'add' and len(args) == 1:
+        replies = []
+        for gpu_id in parse_gpu_targets(args[0]):
+            extend_resource_governor(gpu_id)
+            started = start_gpu_worker(gpu_id, address)
+            replies.append(f"GPU {gpu_id}: {'started' if started else 'already present'}")
+            if started:
+                safe_print(f"[GPU {gpu_id}] ➕ Worker added via control socket")
+        return "\n".join(replies)
+    if cmd in ('remove', 'pause', 'resume') and args:
+        replies = []
+        for gpu_id in parse_gpu_targets(args[0]):
+            with WORKERS_LOCK:
+                control = WORKERS.get(gpu_id)
+            if control is None:
+                replies.append(f"GPU {gpu_id}: no such worker")
+                continue
+            if cmd == 'remove':
+                control.stopping.set()
+                control.running.set()
+                if len(args) > 1 and args[1] == 'now':
+                    child = ACTIVE_CHILDREN.get(gpu_id)
+                    if child is not None:
+                        child.terminate()
+                safe_print(f"[GPU {gpu_id}] ➖ Worker removal requested via control socket")
+            elif cmd == 'pause':
+                control.running.clear()
+                control.release_prefetched()
+            else:
+                control.running.set()
+            replies.append(f"GPU {gpu_id}: {control.state()}")
+        return "\n".join(replies)
+    if cmd == 'drain':
+        request_drain(float(args[0]) if args else None)
+        return "draining"
+    if cmd == 'prefetch' and len(args) == 1 and args[0].isdigit():
+        PREFETCH_DEPTH = int(args[0])
+        return f"prefetch depth: {PREFETCH_DEPTH}"
+    return CONTROL_HELP
+
+def start_control_server(address):
+    """Serve control commands on a Unix socket; None if unavailable"""
+    import socket
+    if not CONTROL_SOCKET or not hasattr(socket, 'AF_UNIX'):
+        return None
+    if os.path.exists(CONTROL_SOCKET):
+        try:
+            send_control_command('status')
+            safe_print(f"⚠️ Control socket {CONTROL_SOCKET} is owned by another running instance")
+            return None
+        except OSError:
+            pass
+    try:
+        if os.path.exists(CONTROL_SOCKET):
+            os.unlink(CONTROL_SOCKET)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(CONTROL_SOCKET)
+        os.chmod(CONTROL_SOCKET, 0o600)
+        server.listen(4)
+    except OSError as e:
+        safe_print(f"⚠️ Control socket unavailable: {e}")
+        return None
+    
+    def serve():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                try:
+                    request = conn.makefile('r', encoding='utf-8').readline().strip()
+                    reply = handle_control_command(request, address)
+                except Exception as e:
+                    reply = f"error: {e}"
+                try:
+                    conn.sendall((reply + "\n").encode('utf-8'))
+                except OSError:
+                    pass
+    threading.Thread(target=serve, daemon=True).start()
+    safe_print(f"🎛️ Control socket: {CONTROL_SOCKET}")
+    return server
+
+def send_control_command(command):
+    """Client side of --control"""
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(CONTROL_SOCKET)
+        client.sendall((command + "\n").encode('utf-8'))
+        chunks = []
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            chunks.append(data)
+    return b"".join(chunks).decode('utf-8').rstrip()
 
 # =============================================
 # MAIN FUNCTION
 # =============================================
 def main():
     """Main function"""
-    global STOP_SEARCH_FLAG, CURRENT_GLOBAL_BATCH_ID
+    global STOP_SEARCH_FLAG, CURRENT_GLOBAL_BATCH_ID, BATCH_DB, PREFETCH_DEPTH
     
     # Security checks
     SecurityCheck.integrity_check()
@@ -668,15 +2811,58 @@ def main():
     
     warnings.filterwarnings("ignore")
     
+    # Control commands talk to a running instance; nothing else is needed
+    if len(sys.argv) >= 3 and sys.argv[1] == "--control":
+        try:
+            print(send_control_command(" ".join(sys.argv[2:])))
+        except OSError as e:
+            print(f"❌ Cannot reach control socket {CONTROL_SOCKET}: {e}")
+            sys.exit(1)
+        return
+    
+    # Log queries only read local files; no config, DB or binary needed
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "--query-log":
+        log_dir = sys.argv[3] if len(sys.argv) == 4 else LOG_DIR
+        matched = 0
+        for record in query_structured_logs(sys.argv[2], log_dir):
+            print(json.dumps(record))
+            matched += 1
+        if not matched:
+            print(f"No records for batch {sys.argv[2]} in {log_dir}")
+        return
+    
     # Initialize encrypted configuration FIRST
     init_encrypted_config()
     
-    check_and_install_dependencies()
-    if not check_and_download_xiebo():
-        sys.exit(1)
+    run_preflight(need_db=not SQLITE_DB and not (len(sys.argv) > 1 and sys.argv[1] in DB_FREE_MODES))
     
     ensure_log_dir()
     
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "--db-maint":
+        action = sys.argv[2] if len(sys.argv) == 3 else 'all'
+        if action not in ('indexes', 'archive', 'perf', 'report', 'all'):
+            print("Usage: ./xiebo --db-maint [indexes|archive|perf|report|all]")
+            sys.exit(1)
+        try:
+            run_db_maintenance(action)
+        except (TransientDBError, PermanentDBError) as e:
+            safe_print(f"❌ Maintenance failed: {e}")
+            sys.exit(1)
+        return
+    
+    if len(sys.argv) == 3 and sys.argv[1] == "--calibrate":
+        gpu_ids = [int(x.strip()) for x in sys.argv[2].split(',')]
+        init_resource_governor(gpu_ids)
+        sys.exit(1 if run_calibration(gpu_ids) else 0)
+    
+    if len(sys.argv) in (2, 3) and sys.argv[1] == "--perf-report":
+        try:
+            run_perf_report(float(sys.argv[2]) if len(sys.argv) == 3 else PERF_REPORT_HOURS)
+        except (TransientDBError, PermanentDBError) as e:
+            safe_print(f"❌ Report failed: {e}")
+            sys.exit(1)
+        return
+    
     if len(sys.argv) == 5 and sys.argv[1] == "--batch-db":
         gpu_ids = [int(x.strip()) for x in sys.argv[2].split(',')]
         CURRENT_GLOBAL_BATCH_ID = int(sys.argv[3])
@@ -684,28 +2870,61 @@ def main():
         
         safe_print(f"🚀 Multi-GPU Mode: {gpu_ids} | Start ID: {CURRENT_GLOBAL_BATCH_ID}")
         safe_print(f"📊 Target: {target_addr}")
+        try:
+            if init_claim_order(CURRENT_GLOBAL_BATCH_ID):
+                CURRENT_GLOBAL_BATCH_ID = 0
+                safe_print(f"🧭 Claim order: {CLAIM_ORDER.describe()}")
+        except (ValueError, TransientDBError, PermanentDBError) as e:
+            safe_print(f"❌ Cannot set up claim order: {e}")
+            sys.exit(1)
+        init_resource_governor(gpu_ids)
+        install_drain_handler()
         
-        threads = []
-        for gpu in gpu_ids:
-            t = threading.Thread(target=gpu_worker, args=(gpu, target_addr), daemon=True)
-            threads.append(t)
-            t.start()
+        if WORKER_MODE == 'process':
+            # Forked workers cannot see the background check finish
+            if not wait_for_binary():
+                sys.exit(1)
+            safe_print("🧩 Worker mode: one process per GPU")
+            if PREFETCH_DEPTH > 0:
+                # Prefetched ids live in one process; a worker that exits or crashes
+                # would take them with it while the shared counter has moved past
+                safe_print("⚠️ XIEBO_PREFETCH_DEPTH is ignored in process mode")
+                PREFETCH_DEPTH = 0
+            run_process_supervisor(gpu_ids, CURRENT_GLOBAL_BATCH_ID, target_addr)
+            return
         
-        try:
-            while any(t.is_alive() for t in threads):
-                with STOP_SEARCH_FLAG_LOCK:
-                    if STOP_SEARCH_FLAG:
-                        safe_print("\n🛑 Stop Flag detected. Closing workers...")
-                        break
-                time.sleep(2)
-        except KeyboardInterrupt:
-            safe_print("\n⚠️ User Interrupted.")
+        run_thread_workers(gpu_ids, target_addr)
+    elif len(sys.argv) in (5, 6) and sys.argv[1] == "--sweep":
+        gpu_ids = [int(x.strip()) for x in sys.argv[2].split(',')]
+        target_addr = sys.argv[-1]
+        if len(sys.argv) == 6:
+            BATCH_DB = LocalSweepSource.from_bounds(sys.argv[3], sys.argv[4], state_file=SWEEP_STATE_FILE or None)
+        else:
+            try:
+                BATCH_DB = LocalSweepSource.from_file(sys.argv[3], state_file=SWEEP_STATE_FILE or None)
+            except OSError as e:
+                safe_print(f"❌ Cannot read ranges file: {e}")
+                print("Usage: ./xiebo --sweep GPU_IDS RANGES_FILE|- ADDRESS")
+                sys.exit(1)
+        CURRENT_GLOBAL_BATCH_ID = BATCH_DB.done_below
+        
+        safe_print(f"🚀 Local Sweep Mode: {gpu_ids} | chunks of 2^{BATCH_DB.chunk_bits} keys")
+        safe_print(f"💾 State: {BATCH_DB.state_file} (resuming at chunk {BATCH_DB.done_below})")
+        safe_print(f"📊 Target: {target_addr}")
+        init_resource_governor(gpu_ids)
+        install_drain_handler()
+        run_thread_workers(gpu_ids, target_addr)
+        
+        done, total = BATCH_DB.progress()
+        safe_print(f"\n📋 Sweep progress: {done}/{total} chunks done")
     elif len(sys.argv) == 5:
         # Single run mode
         gpu_id = sys.argv[1]
         start_hex = sys.argv[2]
         range_bits = int(sys.argv[3])
         address = sys.argv[4]
+        init_resource_governor([int(gpu_id)])
+        pin_current_thread(gpu_id)
         run_xiebo(gpu_id, start_hex, range_bits, address)
     else:
         # Usage information
@@ -716,9 +2935,25 @@ def main():
         print("  Multi-GPU Database Mode:")
         print("    ./xiebo --batch-db GPU_IDS START_ID ADDRESS")
         print("    ./xiebo --batch-db 0,1 49 1Pd8VvT49sHKsmqrQiP61RsVwmXCZ6ay7Z")
+        print("    Claim order: XIEBO_CLAIM_POLICY=sequential|sharded|strided|random|priority")
+        print("                 XIEBO_HOST_COUNT=N XIEBO_HOST_INDEX=0..N-1 (default: hostname hash)")
         print("\n  Single Run Mode:")
         print("    ./xiebo GPU_ID START_HEX RANGE_BITS ADDRESS")
         print("    Example: ./xiebo 0 0000000000000001 64 1Pd8VvT49sHKsmqrQiP61RsVwmXCZ6ay7Z")
+        print("\n  Local Sweep Mode (no database, resumable):")
+        print("    ./xiebo --sweep GPU_IDS START_HEX END_HEX ADDRESS")
+        print("    ./xiebo --sweep GPU_IDS RANGES_FILE|- ADDRESS")
+        print("\n  Batch Table Maintenance (online, chunked):")
+        print("    ./xiebo --db-maint [indexes|archive|perf|report|all]")
+        print("\n  GPU Calibration (health check + suggested batch range bits):")
+        print("    ./xiebo --calibrate GPU_IDS")
+        print("    XIEBO_CALIBRATE=1 runs it before claiming and every XIEBO_CALIBRATION_INTERVAL seconds")
+        print("\n  Batch Performance Report (keys/sec by host, GPU and hour):")
+        print("    ./xiebo --perf-report [HOURS]")
+        print("\n  Control A Running Instance:")
+        print("    ./xiebo --control status|add 2|remove 1 [now]|pause all|resume all|prefetch 2")
+        print("\n  Query Structured Logs:")
+        print("    ./xiebo --query-log BATCH_ID [LOG_DIR]")
         print("\n" + "="*60)
         
         # Show decrypted config info (masked)
@@ -727,9 +2962,17 @@ def main():
         safe_print(f"   Special Address: {SPECIAL_ADDRESS_NO_OUTPUT[:10]}...")
         safe_print(f"   Download URL: {DOWNLOAD_URL[:30]}...")
         print("="*60)
+    
+    finish_binary_check()
+    if BINARY_READY.is_set() and not BINARY_OK:
+        sys.exit(1)
 
 # =============================================
 # ENTRY POINT
 # =============================================
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Early returns and sys.exit in any mode must not cut a download short
+        finish_binary_check()
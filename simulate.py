@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+FLEET SIMULATOR: CAPACITY PLANNING FOR --batch-db CAMPAIGNS
+
+Discrete-event model of many hosts running gpu_worker against one batch
+table. The claim order and claim decision (cenlo.claim_steps), the skip rule,
+range sizing, retry backoff and the circuit breaker all come from cenlo.py
+itself. The simulator only replaces the clock, the database and the GPU
+binary. Runs of probes that would be skipped ('done' or 'inprogress' rows)
+on a contiguous walk are charged in bulk with the same query count and
+latency, so walking a busy table does not cost one event per row.
+
+Example:
+    python simulate.py --hosts 50 --gpus-per-host 8 --batches 200000 --range-bits 36
+"""
+
+import argparse
+import bisect
+import heapq
+import itertools
+import random
+import sys
+import time
+
+import cenlo
+
+class SimDB:
+    """In-memory batch table with query accounting"""
+    def __init__(self, batch_count, range_bits, done_fraction, rng, clock):
+        self.batch_count = batch_count
+        self.clock = clock
+        self.stamped = {}   # batch_id -> time of its last status update (start_tm)
+        self.range_bits = range_bits
+        self.status = ['done' if rng.random() < done_fraction else None for _ in range(batch_count)]
+        self.running = [0] * batch_count
+        self.queries = 0
+        # next_open[i] jumps over rows a probe would skip ('done' or
+        # 'inprogress'); rows that later become runnable again ('error')
+        # cannot be un-joined, so they are tracked in a sorted side list.
+        self.next_open = list(range(batch_count + 1))
+        self.reopened = []
+        for i, st in enumerate(self.status):
+            if st == 'done':
+                self.next_open[i] = i + 1
+
+    def _find(self, batch_id):
+        root = batch_id
+        while self.next_open[root] != root:
+            root = self.next_open[root]
+        while self.next_open[batch_id] != root:
+            self.next_open[batch_id], batch_id = root, self.next_open[batch_id]
+        return root
+
+    def first_open(self, batch_id):
+        """Smallest id >= batch_id that a probe would not skip right now"""
+        if batch_id < 0 or batch_id >= self.batch_count:
+            return batch_id
+        open_id = self._find(batch_id)
+        i = bisect.bisect_left(self.reopened, batch_id)
+        if i < len(self.reopened):
+            open_id = min(open_id, self.reopened[i])
+        return open_id
+
+    def open_ids(self, lo, hi, limit, retried_since=None):
+        """Same rows as BatchDB.open_ids"""
+        ids = []
+        batch_id = self.first_open(max(lo, 0))
+        while batch_id <= min(hi, self.batch_count - 1) and len(ids) < limit:
+            if not (retried_since is not None and self.status[batch_id] == 'error'
+                    and self.stamped[batch_id] >= retried_since):
+                ids.append(batch_id)
+            batch_id = self.first_open(batch_id + 1)
+        return ids
+
+    def get_batch(self, batch_id):
+        if batch_id < 0 or batch_id >= self.batch_count:
+            return None
+        start_int = batch_id << self.range_bits
+        return {
+            'id': batch_id,
+            'start_range': f"{start_int:016X}",
+            'end_range': f"{start_int + (1 << self.range_bits) - 1:016X}",
+            'status': self.status[batch_id],
+        }
+
+    def update_status(self, batch_id, status):
+        self.status[batch_id] = status
+        self.stamped[batch_id] = self.clock()
+        i = bisect.bisect_left(self.reopened, batch_id)
+        is_reopened = i < len(self.reopened) and self.reopened[i] == batch_id
+        if cenlo.should_run_batch({'status': status}):
+            if not is_reopened:
+                self.reopened.insert(i, batch_id)
+        else:
+            self.next_open[batch_id] = batch_id + 1
+            if is_reopened:
+                del self.reopened[i]
+
+class SimHost:
+    """One machine: its own START_ID counter, claim order, returned ids and circuit breaker"""
+    def __init__(self, sim, host_id, start_id, order=None):
+        self.host_id = host_id
+        self.counter = 0 if order else start_id
+        self.order = order
+        self.returned = []
+        self.breaker = cenlo.CircuitBreaker(clock=lambda: sim.now, announce=False)
+        self.retry = cenlo.BatchDB(breaker=self.breaker)
+
+    # ticket source and returned ids for cenlo.claim_steps
+    def next_ticket(self):
+        ticket = self.counter
+        self.counter += 1
+        return ticket
+
+    def pop_returned(self):
+        return self.returned.pop(0) if self.returned else None
+
+    def return_ids(self, batch_ids):
+        self.returned.extend(batch_ids)
+        self.returned.sort()
+
+class FleetSimulator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        random.seed(args.seed)  # BatchDB.backoff_delay draws from the module RNG
+        self.now = 0.0
+        self.heap = []
+        self.seq = itertools.count()
+        self.db = SimDB(args.batches, args.range_bits, args.done_fraction, self.rng, clock=lambda: self.now)
+
+        self.keys_scanned = 0
+        self.keys_duplicated = 0
+        self.gpu_busy_seconds = 0.0
+        self.gpu_count = args.hosts * args.gpus_per_host
+        self.worker_end_times = []
+        self.completed = set()
+        self.priority_lists = {}
+
+    # ---- event loop ----
+    def _step(self, gen):
+        try:
+            delay = next(gen)
+        except StopIteration:
+            self.worker_end_times.append(self.now)
+            return
+        heapq.heappush(self.heap, (self.now + delay, next(self.seq), gen))
+
+    def claim_order(self, host_index, start_id):
+        if self.args.claim_policy == 'sequential':
+            return None
+        priority_ids = None
+        if self.args.claim_policy == 'priority':
+            # No priority column here: a fixed shuffle stands in for it (one list per START_ID)
+            priority_ids = self.priority_lists.get(start_id)
+            if priority_ids is None:
+                priority_ids = list(range(start_id, self.args.batches))
+                random.Random(self.args.seed).shuffle(priority_ids)
+                self.priority_lists[start_id] = priority_ids
+        order = cenlo.ClaimOrder(self.args.claim_policy, start_id, self.args.batches - 1,
+                                 host_index, self.args.hosts, self.args.claim_window, priority_ids)
+        order.started = self.now
+        return order
+
+    def run(self):
+        for h in range(self.args.hosts):
+            start_id = h * self.args.batches // self.args.hosts if self.args.staggered else self.args.start_id
+            host = SimHost(self, h, start_id, self.claim_order(h, start_id))
+            for _ in range(self.args.gpus_per_host):
+                rate = self.args.rate_mkeys * self.rng.lognormvariate(0, self.args.rate_sigma) * 1e6
+                self._step(self.gpu_worker(host, rate))
+        while self.heap:
+            self.now, _, gen = heapq.heappop(self.heap)
+            self._step(gen)
+
+    # ---- database, mirroring BatchDB.execute ----
+    def db_call(self, host, fn):
+        """Yields delays; returns (True, result) or (False, suggested_wait)"""
+        for attempt in range(host.retry.attempts):
+            try:
+                host.breaker.before_call()
+            except cenlo.CircuitOpenError as e:
+                return False, e.retry_after
+            self.db.queries += 1
+            if self.rng.random() < self.args.db_fail_rate:
+                yield self.args.db_timeout
+                host.breaker.record_failure()
+                if attempt + 1 < host.retry.attempts:
+                    yield host.retry.backoff_delay(attempt)
+                continue
+            yield self.rng.expovariate(1.0 / self.args.db_latency)
+            host.breaker.record_success()
+            return True, fn()
+        return False, host.retry.backoff_delay(3)
+
+    def update_status(self, host, batch_id, status):
+        ok, _ = yield from self.db_call(host, lambda: self.db.update_status(batch_id, status))
+        return ok
+
+    def open_ids(self, host, lo, hi, limit, retried_since=None):
+        """Mirrors wait_for_open_ids"""
+        while True:
+            ok, result = yield from self.db_call(host, lambda: self.db.open_ids(lo, hi, limit, retried_since))
+            if ok:
+                return result
+            yield min(max(result, 1.0), cenlo.DB_RETRY_MAX_DELAY)
+
+    # ---- claiming, driving cenlo.claim_steps like claim_batch_id ----
+    def skip_run(self, host, batch_id, run_end):
+        """Charge probes over skippable ids in bulk; returns the first id worth a real probe.
+        Only valid at the counter frontier of a contiguous walk, before any yield."""
+        open_id = min(self.db.first_open(batch_id), run_end)
+        skipped = open_id - batch_id
+        if skipped > 0:
+            self.db.queries += skipped
+            host.counter += skipped
+            yield self.rng.gammavariate(skipped, self.args.db_latency)
+        return open_id
+
+    def claim(self, host):
+        """Drives cenlo.claim_steps, charging its range queries like any other query"""
+        while True:
+            drawn = []
+            def next_ticket():
+                drawn.append(host.next_ticket())
+                return drawn[-1]
+            steps = cenlo.claim_steps(host.order, next_ticket, host.pop_returned, host.return_ids)
+            try:
+                query = next(steps)
+                while True:
+                    query = steps.send((yield from self.open_ids(host, *query)))
+            except StopIteration as done:
+                batch_id = done.value
+
+            # Walking a contiguous run ticket by ticket: charge its skippable ids in bulk
+            order = host.order
+            if batch_id is cenlo.WorkerControl.END_OF_WORK or not drawn or host.counter != drawn[-1] + 1:
+                return batch_id
+            if order is None:
+                run_end = self.db.batch_count
+            elif order.contiguous and order.phase(drawn[-1]) == 'own':
+                run_end = min(order.first_id + order.own_hi, self.db.batch_count)
+            else:
+                return batch_id
+            batch_id = yield from self.skip_run(host, batch_id, run_end)
+            if batch_id < run_end:
+                return batch_id
+            if order is None:
+                return run_end
+
+    # ---- worker, mirroring gpu_worker / wait_for_batch / run_xiebo ----
+    def gpu_worker(self, host, rate):
+        while True:
+            batch_id = yield from self.claim(host)
+            if batch_id is cenlo.WorkerControl.END_OF_WORK:
+                return
+            while True:
+                ok, result = yield from self.db_call(host, lambda: self.db.get_batch(batch_id))
+                if ok:
+                    break
+                yield min(max(result, 1.0), cenlo.DB_RETRY_MAX_DELAY)
+            batch = result
+            if not batch:
+                if host.order:
+                    continue
+                return
+            if not cenlo.should_run_batch(batch):
+                continue
+
+            range_bits = cenlo.calculate_range_bits(batch['start_range'], batch['end_range'])
+            yield from self.update_status(host, batch_id, 'inprogress')
+
+            keys = 1 << range_bits
+            duplicate = self.db.running[batch_id] > 0 or batch_id in self.completed
+            self.db.running[batch_id] += 1
+            failed = self.rng.random() < self.args.batch_fail_rate
+            scan_seconds = keys / rate * (self.rng.random() if failed else 1.0)
+            yield self.args.startup_overhead + scan_seconds
+            self.db.running[batch_id] -= 1
+
+            self.gpu_busy_seconds += scan_seconds
+            scanned = int(scan_seconds * rate) if failed else keys
+            self.keys_scanned += scanned
+            if duplicate:
+                self.keys_duplicated += scanned
+            final_status = 'error' if failed else 'done'
+            if not failed:
+                self.completed.add(batch_id)
+
+            if not (yield from self.update_status(host, batch_id, final_status)):
+                yield 2
+                yield from self.update_status(host, batch_id, final_status)
+            yield 0.5
+
+    def report(self):
+        makespan = max(self.worker_end_times) if self.worker_end_times else 0.0
+        capacity = self.gpu_count * makespan
+        unfinished = sum(1 for st in self.db.status if st != 'done')
+        return {
+            'completion_seconds': makespan,
+            'gpu_idle_fraction': 1 - self.gpu_busy_seconds / capacity if capacity else 0.0,
+            'duplicate_fraction': self.keys_duplicated / self.keys_scanned if self.keys_scanned else 0.0,
+            'db_queries': self.db.queries,
+            'db_qps': self.db.queries / makespan if makespan else 0.0,
+            'unfinished_batches': unfinished,
+        }
+
+def format_duration(seconds):
+    days, rem = divmod(int(seconds), 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes, secs = divmod(rem, 60)
+    if days:
+        return f"{days}d {hours}h {minutes}m"
+    if hours:
+        return f"{hours}h {minutes}m {secs}s"
+    return f"{minutes}m {secs}s"
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Simulate a --batch-db fleet")
+    parser.add_argument('--hosts', type=int, default=4)
+    parser.add_argument('--gpus-per-host', type=int, default=8)
+    parser.add_argument('--batches', type=int, default=10000, help="rows in the batch table")
+    parser.add_argument('--range-bits', type=int, default=36, help="keys per batch = 2^bits")
+    parser.add_argument('--done-fraction', type=float, default=0.0, help="rows already 'done' at start")
+    parser.add_argument('--start-id', type=int, default=0, help="START_ID given to every host")
+    parser.add_argument('--staggered', action='store_true', help="spread host START_IDs across the table")
+    parser.add_argument('--claim-policy', choices=cenlo.CLAIM_POLICIES, default='sequential',
+                        help="claim order per host (XIEBO_CLAIM_POLICY)")
+    parser.add_argument('--claim-window', type=int, default=1024, help="window size for --claim-policy random")
+    parser.add_argument('--rate-mkeys', type=float, default=1500.0, help="median GPU rate in MK/s")
+    parser.add_argument('--rate-sigma', type=float, default=0.25, help="lognormal spread of GPU rates")
+    parser.add_argument('--startup-overhead', type=float, default=3.0, help="seconds per ./log launch")
+    parser.add_argument('--db-latency', type=float, default=0.02, help="mean seconds per query")
+    parser.add_argument('--db-timeout', type=float, default=5.0, help="seconds lost per failed query")
+    parser.add_argument('--db-fail-rate', type=float, default=0.0, help="probability a query fails")
+    parser.add_argument('--batch-fail-rate', type=float, default=0.0, help="probability a batch errors out")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    wall_start = time.time()
+    sim = FleetSimulator(args)
+    sim.run()
+    result = sim.report()
+
+    print("=" * 60)
+    print(f"📊 Fleet: {args.hosts} hosts x {args.gpus_per_host} GPUs | "
+          f"{args.batches} batches of 2^{args.range_bits} keys | {args.claim_policy} claims")
+    print("=" * 60)
+    print(f"   Completion time:     {format_duration(result['completion_seconds'])}")
+    print(f"   GPU idle fraction:   {result['gpu_idle_fraction'] * 100:.2f}%")
+    print(f"   Duplicate scans:     {result['duplicate_fraction'] * 100:.2f}% of keys")
+    print(f"   DB queries/sec:      {result['db_qps']:.2f} ({result['db_queries']} total)")
+    print(f"   Unfinished batches:  {result['unfinished_batches']}")
+    print(f"   Simulated in {time.time() - wall_start:.2f}s")
+    return result
+
+if __name__ == "__main__":
+    main()